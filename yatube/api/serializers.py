@@ -0,0 +1,67 @@
+"""Ответы API из строк .values() без создания экземпляров моделей."""
+from django.core.files.storage import default_storage
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def image_url(name):
+    return default_storage.url(name) if name else None
+
+
+class Fields:
+    """Поля ответа: имя в API -> колонка для .values() и преобразование.
+
+    Параметр ?fields=id,text,author оставляет в ответе только
+    перечисленные поля, и в SELECT попадают только их колонки (и JOIN
+    только для них).
+    """
+
+    def __init__(self, columns, converters=None):
+        self.columns = columns
+        self.converters = converters or {}
+
+    def requested(self, request):
+        raw = request.GET.get('fields')
+        if not raw:
+            return list(self.columns)
+        names = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = sorted(set(names) - set(self.columns))
+        if unknown:
+            raise InvalidFields(unknown)
+        return names
+
+    def values(self, queryset, names, *extra):
+        """extra - колонки, нужные курсору, но не ответу."""
+        columns = [self.columns[name] for name in names] + list(extra)
+        return queryset.values(*dict.fromkeys(columns))
+
+    def serialize(self, row, names):
+        result = {}
+        for name in names:
+            value = row[self.columns[name]]
+            convert = self.converters.get(name)
+            result[name] = convert(value) if convert else value
+        return result
+
+
+POST = Fields(
+    {
+        'id': 'pk',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+        'comments_count': 'comments_count',
+    },
+    {'image': image_url},
+)
+COMMENT = Fields({
+    'id': 'pk',
+    'text': 'text',
+    'created': 'created',
+    'author': 'author__username',
+    'post': 'post_id',
+})
@@ -0,0 +1,156 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(POSTS_NUMBER=2, COMMENTS_NUMBER=2)
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='api-group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {number}',
+                author=cls.author,
+                group=cls.group if number % 2 else None,
+            )
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+        self.client.force_login(self.reader)
+
+    def post_json(self, url, data):
+        return self.client.post(
+            url, json.dumps(data), content_type='application/json'
+        )
+
+    def test_index_cursor_pages(self):
+        first = self.guest.get(reverse('api:posts')).json()
+        self.assertEqual(
+            [post['text'] for post in first['results']], ['Пост 2', 'Пост 1']
+        )
+        self.assertEqual(first['results'][0]['author'], 'author')
+        self.assertIsNone(first['previous'])
+        second = self.guest.get(first['next']).json()
+        self.assertEqual(
+            [post['text'] for post in second['results']], ['Пост 0']
+        )
+        self.assertIsNone(second['next'])
+
+    def test_sparse_fieldsets(self):
+        response = self.guest.get(
+            reverse('api:posts'), {'fields': 'id,text'}
+        )
+        self.assertEqual(
+            set(response.json()['results'][0]), {'id', 'text'}
+        )
+        self.assertIn('fields=id%2Ctext', response.json()['next'])
+        response = self.guest.get(reverse('api:posts'), {'fields': 'secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['fields'], ['secret'])
+
+    def test_group_profile_and_detail(self):
+        response = self.guest.get(
+            reverse('api:group_posts', args=('api-group',))
+        )
+        self.assertEqual(
+            [post['group'] for post in response.json()['results']],
+            ['api-group'],
+        )
+        response = self.guest.get(
+            reverse('api:profile_posts', args=('author',))
+        )
+        self.assertEqual(len(response.json()['results']), 2)
+        post = self.posts[0]
+        response = self.guest.get(
+            reverse('api:post_detail', args=(post.pk,))
+        )
+        self.assertEqual(response.json()['text'], 'Пост 0')
+        self.assertIsNone(response.json()['image'])
+        response = self.guest.get(
+            reverse('api:profile_posts', args=('nobody',))
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('detail', response.json())
+
+    def test_etag_answers_not_modified_without_queries(self):
+        url = reverse('api:post_detail', args=(self.posts[0].pk,))
+        tag = self.guest.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest.get(url, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 304)
+        self.post_json(
+            reverse('api:comments', args=(self.posts[0].pk,)),
+            {'text': 'Новый комментарий'},
+        )
+        response = self.guest.get(url, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comments_count'], 1)
+
+    def test_create_post(self):
+        response = self.post_json(
+            reverse('api:posts'), {'text': 'Из API', 'group': 'api-group'}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['group'], 'api-group')
+        self.assertTrue(
+            Post.objects.filter(text='Из API', author=self.reader).exists()
+        )
+        response = self.post_json(
+            reverse('api:posts'), {'text': 'Из API', 'group': 'missing'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('group', response.json()['errors'])
+        response = self.guest.post(reverse('api:posts'), {'text': 'Гость'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_comments(self):
+        url = reverse('api:comments', args=(self.posts[0].pk,))
+        for number in range(3):
+            response = self.post_json(url, {'text': f'Комментарий {number}'})
+            self.assertEqual(response.status_code, 201)
+        first = self.guest.get(url).json()
+        self.assertEqual(
+            [comment['text'] for comment in first['results']],
+            ['Комментарий 0', 'Комментарий 1'],
+        )
+        second = self.guest.get(first['next']).json()
+        self.assertEqual(second['results'][0]['author'], 'reader')
+        self.assertEqual(Comment.objects.count(), 3)
+        response = self.client.put(url)
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response['Allow'], 'GET, POST, HEAD')
+
+    def test_follow_and_feed(self):
+        url = reverse('api:following', args=('author',))
+        self.assertEqual(self.guest.post(url).status_code, 401)
+        self.assertEqual(self.client.post(url).json(), {'following': True})
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+            .exists()
+        )
+        feed = self.client.get(reverse('api:follow_feed')).json()
+        self.assertEqual(
+            [post['text'] for post in feed['results']], ['Пост 2', 'Пост 1']
+        )
+        self.assertEqual(
+            len(self.client.get(feed['next']).json()['results']), 1
+        )
+        self.assertEqual(self.client.delete(url).json(), {'following': False})
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(
+            self.client.get(reverse('api:follow_feed')).json()['results'], []
+        )
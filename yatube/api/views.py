@@ -0,0 +1,280 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.http import Http404, HttpResponseNotModified, JsonResponse
+from django.utils.http import parse_etags, quote_etag
+from api.serializers import COMMENT, POST, InvalidFields
+from core.throttling import throttle
+from posts.cache import (GROUPS, POSTS, PROFILES, get_versions,
+                         versions_etag)
+from posts.follows import follow, unfollow
+from posts.forms import CommentForm, PostForm
+from posts.models import Comment, Group, Post, User
+from posts.paginators import CommentPaginator, CursorPaginator
+from posts.thumbnails import schedule as schedule_thumbnail
+from posts.timeline import TimelinePaginator, timeline_parts
+from posts.uploads import oversized_uploads
+
+
+class InvalidBody(ValueError):
+    pass
+
+
+def error(status, detail, **extra):
+    return JsonResponse({'detail': detail, **extra}, status=status)
+
+
+def too_many_requests(request, wait):
+    return error(429, f'Слишком много запросов, повторите через {wait} с.')
+
+
+def api_view(*methods, login=False):
+    """Общие правила API: разрешённые методы, вход и ошибки в JSON.
+
+    Запросы с сессией проходят обычную проверку CSRF, как формы сайта.
+    """
+    if 'GET' in methods:
+        methods += ('HEAD',)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = error(405, 'Метод не поддерживается.')
+                response['Allow'] = ', '.join(methods)
+                return response
+            if login and not request.user.is_authenticated:
+                return error(401, 'Нужна авторизация.')
+            try:
+                return view(request, *args, **kwargs)
+            except Http404:
+                return error(404, 'Не найдено.')
+            except InvalidBody:
+                return error(400, 'Тело запроса - не объект JSON.')
+            except InvalidFields as unknown:
+                return error(
+                    400, 'Неизвестные поля в fields.', fields=unknown.args[0]
+                )
+        return wrapper
+    return decorator
+
+
+def matches(request, tag):
+    return tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+
+
+def not_modified(tag):
+    response = HttpResponseNotModified()
+    response['ETag'] = tag
+    return response
+
+
+def etag(*dependencies):
+    """ETag и ответ 304 Not Modified на If-None-Match.
+
+    С зависимостями (имена версий кеша, как у versioned_page) ETag
+    строится из их версий до обращения к базе, так что неизменившийся
+    ответ обходится без единого запроса. Без зависимостей ETag - хеш
+    тела: экономится только трафик.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            tag = None
+            if dependencies:
+                versions = get_versions(
+                    [name.format(**kwargs) for name in dependencies]
+                )
+                tag = versions_etag(request.get_full_path(), versions)
+                if matches(request, tag):
+                    return not_modified(tag)
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            if tag is None:
+                tag = quote_etag(hashlib.md5(response.content).hexdigest())
+                if matches(request, tag):
+                    return not_modified(tag)
+            response['ETag'] = tag
+            return response
+        return wrapper
+    return decorator
+
+
+def page_link(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def paginate(request, paginator, fields, names):
+    page = paginator.get_page(request.GET.get('cursor'))
+    return JsonResponse({
+        'results': [fields.serialize(row, names) for row in page],
+        'next': page_link(request, page.next_cursor),
+        'previous': page_link(request, page.previous_cursor),
+    })
+
+
+def post_page(request, queryset):
+    names = POST.requested(request)
+    rows = POST.values(queryset, names, 'pk', 'pub_date')
+    return paginate(
+        request, CursorPaginator(rows, settings.POSTS_NUMBER), POST, names
+    )
+
+
+def request_data(request):
+    """Тело запроса: JSON или обычная форма (в том числе с файлом)."""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            raise InvalidBody
+        if not isinstance(data, dict):
+            raise InvalidBody
+        return data, None
+    return request.POST, request.FILES or None
+
+
+def id_or_404(queryset):
+    pk = queryset.values_list('pk', flat=True).first()
+    if pk is None:
+        raise Http404
+    return pk
+
+
+@api_view('GET', 'POST')
+@etag('index')
+def posts(request):
+    if request.method == 'POST':
+        return create_post(request)
+    return post_page(request, Post.objects.all())
+
+
+def create_post(request):
+    if not request.user.is_authenticated:
+        return error(401, 'Нужна авторизация.')
+    data, files = request_data(request)
+    data = data.copy()
+    if data.get('group'):
+        # В ответах группа - slug, форма же ждёт id; неизвестный slug
+        # превращается в ошибку поля group.
+        data['group'] = Group.objects.filter(slug=data['group']).values_list(
+            'pk', flat=True
+        ).first() or 0
+    form = PostForm(data, files=files, oversized=oversized_uploads(request))
+    if not form.is_valid():
+        return error(400, 'Ошибка в данных.', errors=form.errors)
+    post = form.save(commit=False)
+    post.author = request.user
+    post.save()
+    schedule_thumbnail(post)
+    names = list(POST.columns)
+    row = POST.values(Post.objects.filter(pk=post.pk), names).get()
+    return JsonResponse(POST.serialize(row, names), status=201)
+
+
+@api_view('GET')
+@etag('group:{slug}', GROUPS)
+def group_posts(request, slug):
+    group_id = id_or_404(Group.objects.filter(slug=slug))
+    return post_page(request, Post.objects.filter(group_id=group_id))
+
+
+@api_view('GET')
+@etag('profile:{username}', PROFILES)
+def profile_posts(request, username):
+    author_id = id_or_404(User.objects.filter(username=username))
+    return post_page(request, Post.objects.filter(author_id=author_id))
+
+
+@api_view('GET')
+@etag('post:{post_id}', POSTS)
+def post_detail(request, post_id):
+    names = POST.requested(request)
+    row = POST.values(Post.objects.filter(pk=post_id), names).first()
+    if row is None:
+        raise Http404
+    return JsonResponse(POST.serialize(row, names))
+
+
+@api_view('GET', 'POST')
+@etag('post:{post_id}', POSTS)
+def comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    if request.method == 'POST':
+        return create_comment(request, post_id)
+    names = COMMENT.requested(request)
+    rows = COMMENT.values(
+        Comment.objects.filter(post_id=post_id).order_by('created', 'pk'),
+        names,
+        'pk',
+        'created',
+    )
+    return paginate(
+        request,
+        CommentPaginator(rows, settings.COMMENTS_NUMBER),
+        COMMENT,
+        names,
+    )
+
+
+@throttle('comment', respond=too_many_requests)
+def create_comment(request, post_id):
+    if not request.user.is_authenticated:
+        return error(401, 'Нужна авторизация.')
+    data, _ = request_data(request)
+    form = CommentForm(data)
+    if not form.is_valid():
+        return error(400, 'Ошибка в данных.', errors=form.errors)
+    comment = form.save(commit=False)
+    comment.author = request.user
+    comment.post_id = post_id
+    comment.save()
+    names = list(COMMENT.columns)
+    row = COMMENT.values(Comment.objects.filter(pk=comment.pk), names).get()
+    return JsonResponse(COMMENT.serialize(row, names), status=201)
+
+
+@api_view('GET', login=True)
+@etag()
+def follow_feed(request):
+    """Лента подписок: страница id из лент, затем посты одним запросом."""
+    names = POST.requested(request)
+    paginator = TimelinePaginator(
+        timeline_parts(request.user), settings.POSTS_NUMBER
+    )
+    page = paginator.get_page(request.GET.get('cursor'))
+    ids = [row['post_id'] for row in page]
+    rows = {
+        row['pk']: row for row in POST.values(
+            Post.objects.filter(pk__in=ids).order_by(), names, 'pk'
+        )
+    }
+    return JsonResponse({
+        'results': [POST.serialize(rows[pk], names) for pk in ids
+                    if pk in rows],
+        'next': page_link(request, page.next_cursor),
+        'previous': page_link(request, page.previous_cursor),
+    })
+
+
+@api_view('POST', 'DELETE', login=True)
+@throttle('follow', respond=too_many_requests)
+def following(request, username):
+    author_id = id_or_404(User.objects.filter(username=username))
+    if request.method == 'DELETE':
+        unfollow(request.user.pk, author_id)
+        return JsonResponse({'following': False})
+    if author_id == request.user.pk:
+        return error(400, 'Нельзя подписаться на себя.')
+    follow(request.user.pk, author_id)
+    return JsonResponse({'following': True})
@@ -0,0 +1,278 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+# Проверка и увеличение одной командой: между EXISTS и INCRBY ключ мог
+# истечь, и INCRBY создал бы его заново без срока жизни.
+INCR_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 0 then
+    return false
+end
+return redis.call('incrby', KEYS[1], ARGV[1])
+"""
+
+
+class RedisCache(BaseCache):
+    """Общий для всех воркеров кеш на сервере с протоколом Redis.
+
+    Соединения берутся из пула (OPTIONS['MAX_CONNECTIONS']), ключи
+    получают KEY_PREFIX и VERSION стандартным make_key. Целые числа
+    хранятся как есть, чтобы incr выполнялся атомарно на сервере.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured(
+                'Для RedisCache установите пакет redis'
+            )
+        options = params.get('OPTIONS', {})
+        self._pool = redis.ConnectionPool.from_url(
+            server,
+            max_connections=options.get('MAX_CONNECTIONS', 50),
+            socket_timeout=options.get('SOCKET_TIMEOUT', 1),
+            socket_connect_timeout=options.get('SOCKET_CONNECT_TIMEOUT', 1),
+        )
+        self._client = redis.Redis(connection_pool=self._pool)
+        self._incr = self._client.register_script(INCR_SCRIPT)
+        self._pickle_protocol = options.get(
+            'PICKLE_PROTOCOL', pickle.HIGHEST_PROTOCOL
+        )
+
+    def _dumps(self, value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, self._pickle_protocol)
+
+    def _loads(self, data):
+        try:
+            return int(data)
+        except ValueError:
+            return pickle.loads(data)
+
+    def _expiry(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return None
+        return max(0, int(timeout))
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        expiry = self._expiry(timeout)
+        if expiry == 0:
+            return False
+        return bool(self._client.set(
+            self._key(key, version), self._dumps(value), ex=expiry, nx=True
+        ))
+
+    def get(self, key, default=None, version=None):
+        data = self._client.get(self._key(key, version))
+        return default if data is None else self._loads(data)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        expiry = self._expiry(timeout)
+        key = self._key(key, version)
+        if expiry == 0:
+            self._client.delete(key)
+            return
+        self._client.set(key, self._dumps(value), ex=expiry)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        expiry = self._expiry(timeout)
+        key = self._key(key, version)
+        if expiry is None:
+            return bool(self._client.persist(key))
+        return bool(self._client.expire(key, expiry))
+
+    def delete(self, key, version=None):
+        self._client.delete(self._key(key, version))
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self._client.mget(
+            [self._key(key, version) for key in keys]
+        )
+        return {
+            key: self._loads(data)
+            for key, data in zip(keys, values) if data is not None
+        }
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expiry = self._expiry(timeout)
+        pipeline = self._client.pipeline()
+        for key, value in data.items():
+            key = self._key(key, version)
+            if expiry == 0:
+                pipeline.delete(key)
+            else:
+                pipeline.set(key, self._dumps(value), ex=expiry)
+        pipeline.execute()
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._client.delete(*keys)
+
+    def has_key(self, key, version=None):
+        return bool(self._client.exists(self._key(key, version)))
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        value = self._incr(keys=[key], args=[delta])
+        if value is None:
+            raise ValueError(f"Key '{key}' not found")
+        return value
+
+    def clear(self):
+        if not self.key_prefix:
+            self._client.flushdb()
+            return
+        for key in self._client.scan_iter(match=f'{self.key_prefix}:*'):
+            self._client.delete(key)
+
+    def close(self, **kwargs):
+        # Соединения остаются в пуле между запросами.
+        pass
+
+
+class TwoTierCache(BaseCache):
+    """Маленький LRU в памяти процесса перед общим кешем.
+
+    Локально хранятся только ключи с префиксами из LOCAL_KEY_PREFIXES
+    (по умолчанию - страницы, которые всё равно сверяются с версиями из
+    общего кеша), не дольше LOCAL_TIMEOUT секунд. Всё остальное,
+    включая версии, читается и пишется только в общий кеш
+    OPTIONS['SHARED']. Значения хранятся сериализованными, как в
+    LocMemCache, чтобы запросы не делили один изменяемый объект.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'shared')
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self._local_max_entries = options.get('LOCAL_MAX_ENTRIES', 256)
+        self._local_prefixes = tuple(
+            options.get('LOCAL_KEY_PREFIXES', ('page:',))
+        )
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _is_local(self, key):
+        return key.startswith(self._local_prefixes)
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return (pickle.loads(value),)
+
+    def _local_set(self, key, value):
+        with self._lock:
+            self._local[key] = (
+                time.monotonic() + self._local_timeout,
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            )
+            self._local.move_to_end(key)
+            while len(self._local) > self._local_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._local_delete(key)
+        return self.shared.add(key, value, timeout, version)
+
+    def get(self, key, default=None, version=None):
+        if self._is_local(key):
+            entry = self._local_get(key)
+            if entry is not None:
+                return entry[0]
+        value = self.shared.get(key, version=version)
+        if value is None:
+            return default
+        if self._is_local(key):
+            self._local_set(key, value)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version)
+        if self._is_local(key):
+            self._local_set(key, value)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        self._local_delete(key)
+        self.shared.delete(key, version)
+
+    def get_many(self, keys, version=None):
+        found, missing = {}, []
+        for key in keys:
+            entry = self._local_get(key) if self._is_local(key) else None
+            if entry is None:
+                missing.append(key)
+            else:
+                found[key] = entry[0]
+        if missing:
+            fetched = self.shared.get_many(missing, version=version)
+            for key, value in fetched.items():
+                if self._is_local(key):
+                    self._local_set(key, value)
+            found.update(fetched)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version)
+        for key, value in data.items():
+            if self._is_local(key) and key not in failed:
+                self._local_set(key, value)
+        return failed
+
+    def has_key(self, key, version=None):
+        if self._is_local(key) and self._local_get(key) is not None:
+            return True
+        return self.shared.has_key(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(key)
+        return self.shared.incr(key, delta, version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            self._local_delete(key)
+        self.shared.delete_many(keys, version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
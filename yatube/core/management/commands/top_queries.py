@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from core import querylog
+
+ORDERS = {
+    'total': lambda entry: entry[1],
+    'count': lambda entry: entry[0],
+    'max': lambda entry: entry[2],
+    'mean': lambda entry: entry[1] / entry[0],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Выводит формы SQL-запросов (отпечатки), на которые приходится '
+        'больше всего времени базы во всех процессах сайта.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--order', choices=ORDERS, default='total',
+            help='Сортировка: суммарное время, число, максимум, среднее.',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Очистить накопленную сводку после вывода.',
+        )
+
+    def handle(self, *args, **options):
+        entries = querylog.collected()
+        order = ORDERS[options['order']]
+        top = sorted(
+            entries.items(), key=lambda item: order(item[1]), reverse=True
+        )[:options['limit']]
+        all_time = sum(entry[1] for entry in entries.values()) or 1
+        for key, (count, total, longest) in top:
+            self.stdout.write(
+                f'{total * 1000:10.1f} мс {total / all_time:6.1%} '
+                f'{count:8} раз, среднее {total / count * 1000:.2f} мс, '
+                f'максимум {longest * 1000:.1f} мс\n    {key}'
+            )
+        if not top:
+            self.stdout.write('Сводка пуста.')
+        if options['reset']:
+            querylog.reset()
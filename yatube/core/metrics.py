@@ -0,0 +1,246 @@
+"""Метрики запросов в памяти процесса и их вывод в формате Prometheus.
+
+Каждый процесс (воркер gunicorn) копит свои гистограммы, Prometheus
+собирает их с каждого воркера отдельно.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+_current = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """Счётчики одного запроса, которые заполняют обёртки."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.card_hits = 0
+        self.card_misses = 0
+
+
+def current():
+    """Счётчики текущего запроса или None, если он не в выборке."""
+    return _current.get()
+
+
+@contextmanager
+def collecting(stats):
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def record_cache(hit, cache='page'):
+    """Попадание или промах кеша страниц или, при cache='card', карточек."""
+    stats = current()
+    if stats is None:
+        return
+    if cache == 'card':
+        if hit:
+            stats.card_hits += 1
+        else:
+            stats.card_misses += 1
+    elif hit:
+        stats.cache_hits += 1
+    else:
+        stats.cache_misses += 1
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """Обёртка для connection.execute_wrapper: время и число запросов."""
+    stats = current()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+_templates_instrumented = False
+
+
+def instrument_templates():
+    """Считает время рендера шаблонов, запущенного из view.
+
+    Оборачивается Template бэкенда Django: через него идут render() и
+    render_to_string, а вложенные include рендерятся внутри и повторно
+    не считаются.
+    """
+    global _templates_instrumented
+    if _templates_instrumented:
+        return
+    from django.template.backends.django import Template
+
+    original = Template.render
+
+    @wraps(original)
+    def render(self, *args, **kwargs):
+        stats = current()
+        if stats is None:
+            return original(self, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            stats.template_time += time.perf_counter() - started
+
+    Template.render = render
+    _templates_instrumented = True
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name, str(value).replace('\\', r'\\').replace('"', r'\"')
+        )
+        for name, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield f'{self.name}_total{_format_labels(labels)} {value}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def observe(self, labels, value):
+        counts, total = self.values.get(labels, (None, 0))
+        if counts is None:
+            counts = [0] * (len(self.buckets) + 1)
+        counts[bisect_left(self.buckets, value)] += 1
+        self.values[labels] = (counts, total + value)
+
+    def samples(self):
+        for labels, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                bucket_labels = _format_labels(labels + (('le', bound),))
+                yield f'{self.name}_bucket{bucket_labels} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(labels)} {total}'
+            yield f'{self.name}_count{_format_labels(labels)} {cumulative}'
+
+
+class Registry:
+    """Набор метрик процесса; обновляется под блокировкой."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.append(f'# HELP {metric.name} {metric.documentation}')
+                lines.append(f'# TYPE {metric.name} {metric.kind}')
+                lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self.lock:
+            for metric in self.metrics:
+                metric.values.clear()
+
+
+REGISTRY = Registry()
+REQUESTS = REGISTRY.add(Counter(
+    'yatube_requests', 'Обработанные запросы.'
+))
+DURATION = REGISTRY.add(Histogram(
+    'yatube_request_duration_seconds',
+    'Полное время ответа.',
+    DURATION_BUCKETS,
+))
+DB_QUERIES = REGISTRY.add(Histogram(
+    'yatube_request_db_queries',
+    'Число SQL-запросов за запрос (по выборке).',
+    QUERY_BUCKETS,
+))
+DB_DURATION = REGISTRY.add(Histogram(
+    'yatube_request_db_duration_seconds',
+    'Время SQL-запросов за запрос (по выборке).',
+    DURATION_BUCKETS,
+))
+TEMPLATE_DURATION = REGISTRY.add(Histogram(
+    'yatube_request_template_duration_seconds',
+    'Время рендера шаблонов за запрос (по выборке).',
+    DURATION_BUCKETS,
+))
+CACHE = REGISTRY.add(Counter(
+    'yatube_page_cache', 'Попадания и промахи кеша страниц (по выборке).'
+))
+CARD_CACHE = REGISTRY.add(Counter(
+    'yatube_card_cache',
+    'Попадания и промахи кеша карточек постов (по выборке).',
+))
+
+
+def observe(view, method, status, duration, stats=None):
+    labels = (('view', view), ('method', method))
+    with REGISTRY.lock:
+        REQUESTS.inc(labels + (('status', status),))
+        DURATION.observe(labels, duration)
+        if stats is None:
+            return
+        DB_QUERIES.observe(labels, stats.queries)
+        DB_DURATION.observe(labels, stats.db_time)
+        TEMPLATE_DURATION.observe(labels, stats.template_time)
+        if stats.cache_hits:
+            CACHE.inc((('view', view), ('result', 'hit')), stats.cache_hits)
+        if stats.cache_misses:
+            CACHE.inc(
+                (('view', view), ('result', 'miss')), stats.cache_misses
+            )
+        if stats.card_hits:
+            CARD_CACHE.inc(
+                (('view', view), ('result', 'hit')), stats.card_hits
+            )
+        if stats.card_misses:
+            CARD_CACHE.inc(
+                (('view', view), ('result', 'miss')), stats.card_misses
+            )
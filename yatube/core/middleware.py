@@ -0,0 +1,126 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from core import metrics, querylog, routers
+
+
+class PerformanceMiddleware:
+    """Время ответа каждого запроса по имени URL и разбивка по выборке.
+
+    Полное время пишется для всех запросов. Число и время SQL-запросов,
+    время рендера шаблонов и попадания в кеш страниц собираются только
+    для доли PERFORMANCE_SAMPLE_RATE запросов: обёртки курсоров и
+    шаблонов остальным запросам почти ничего не стоят. Результаты
+    попадают в гистограммы metrics и в заголовок Server-Timing.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        metrics.instrument_templates()
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        if random.random() >= settings.PERFORMANCE_SAMPLE_RATE:
+            response = self.get_response(request)
+            self.finish(request, response, started)
+            return response
+        stats = metrics.RequestStats()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(metrics.query_wrapper)
+                )
+            stack.enter_context(metrics.collecting(stats))
+            response = self.get_response(request)
+        self.finish(request, response, started, stats)
+        return response
+
+    def finish(self, request, response, started, stats=None):
+        duration = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        metrics.observe(
+            view, request.method, response.status_code, duration, stats
+        )
+        timings = []
+        if stats is not None:
+            timings += [
+                f'db;dur={stats.db_time * 1000:.1f};'
+                f'desc="{stats.queries} queries"',
+                f'tpl;dur={stats.template_time * 1000:.1f}',
+                f'cache;desc="hit {stats.cache_hits} '
+                f'miss {stats.cache_misses}"',
+            ]
+            if stats.card_hits or stats.card_misses:
+                timings.append(
+                    f'card;desc="hit {stats.card_hits} '
+                    f'miss {stats.card_misses}"'
+                )
+        timings.append(f'total;dur={duration * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(timings)
+
+
+class QueryStatsMiddleware:
+    """Складывает все SQL-запросы по отпечаткам и пишет медленные в журнал.
+
+    В отличие от PerformanceMiddleware работает для каждого запроса:
+    отпечаток текста кешируется, так что обёртка стоит пару словарных
+    операций на запрос к базе.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(querylog.query_wrapper)
+                )
+            stack.enter_context(querylog.tracking(request))
+            response = self.get_response(request)
+        querylog.STATS.flush()
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Отправляет чтения view из REPLICA_VIEWS в реплики.
+
+    После запроса с записью в основную базу (POST, подписка, вход)
+    пользователь получает cookie REPLICA_PIN_COOKIE и ещё
+    REPLICA_PIN_SECONDS читает только из основной базы: реплика может
+    отставать, а свои изменения он должен видеть сразу.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        with routers.routing(use_replica=False) as state:
+            request.replica_routing = state
+            response = self.get_response(request)
+        if state.wrote or request.method not in ('GET', 'HEAD'):
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = getattr(request, 'replica_routing', None)
+        if state is None or state.wrote:
+            return None
+        state.use_replica = (
+            request.method in ('GET', 'HEAD')
+            and request.resolver_match.view_name in settings.REPLICA_VIEWS
+            and settings.REPLICA_PIN_COOKIE not in request.COOKIES
+        )
+        return None
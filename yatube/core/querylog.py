@@ -0,0 +1,175 @@
+"""Сводка SQL-запросов по отпечаткам и журнал медленных запросов.
+
+Отпечаток - текст запроса без значений: числа и строки заменены на ?,
+списки IN (...) свёрнуты, так что запросы одной формы складываются
+вместе. Каждый процесс копит сводку у себя и раз в
+QUERY_STATS_FLUSH_INTERVAL секунд записывает её в общий кеш под своим
+ключом; команда top_queries складывает сводки всех процессов.
+"""
+import logging
+import os
+import re
+import socket
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from core import metrics
+
+logger = logging.getLogger('yatube.slow_queries')
+
+CACHE_ALIAS = 'shared'
+PROCESSES_KEY = 'querystats:processes'
+SNAPSHOT_TIMEOUT = 24 * 60 * 60
+OTHER = '<прочие запросы>'
+# Обёртки execute, кадры которых не считаются источником запроса.
+INSTRUMENTATION = (__file__, metrics.__file__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\bIN \((?:\?, )*\?\)', re.IGNORECASE)
+_VALUES_LIST = re.compile(r'VALUES (\([?, ]*\))(?:, \([?, ]*\))+')
+_SPACES = re.compile(r'\s+')
+
+_request = ContextVar('query_stats_request', default=None)
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """Нормализованный текст запроса, одинаковый для запросов одной формы."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _SPACES.sub(' ', sql).strip()
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _VALUES_LIST.sub(r'VALUES \1, ...', sql)
+
+
+def process_key():
+    return f'querystats:{socket.gethostname()}:{os.getpid()}'
+
+
+class QueryStats:
+    """Число, суммарное и наибольшее время запросов по отпечаткам."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.flushed = time.monotonic()
+
+    def add(self, sql, duration):
+        key = fingerprint(sql)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                if len(self.entries) >= settings.QUERY_STATS_MAX_FINGERPRINTS:
+                    key = OTHER
+                    entry = self.entries.get(key)
+                if entry is None:
+                    entry = self.entries[key] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += duration
+            entry[2] = max(entry[2], duration)
+
+    def snapshot(self):
+        with self.lock:
+            return {key: list(entry) for key, entry in self.entries.items()}
+
+    def flush(self, force=False):
+        """Записывает сводку процесса в общий кеш не чаще интервала."""
+        now = time.monotonic()
+        interval = settings.QUERY_STATS_FLUSH_INTERVAL
+        if not force and now - self.flushed < interval:
+            return
+        self.flushed = now
+        cache = caches[CACHE_ALIAS]
+        key = process_key()
+        cache.set(key, self.snapshot(), SNAPSHOT_TIMEOUT)
+        # Список процессов - {ключ: время сброса}. Он обновляется без
+        # блокировки: ключ, потерянный при одновременной записи, вернётся
+        # при следующем сбросе. Процессы, чьи сводки уже истекли,
+        # выбрасываются, чтобы список не рос с каждым перезапуском.
+        stale = time.time() - SNAPSHOT_TIMEOUT
+        processes = {
+            name: flushed
+            for name, flushed in (cache.get(PROCESSES_KEY) or {}).items()
+            if flushed > stale
+        }
+        processes[key] = time.time()
+        cache.set(PROCESSES_KEY, processes, SNAPSHOT_TIMEOUT)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+STATS = QueryStats()
+
+
+def collected():
+    """Сводка всех процессов: {отпечаток: [число, сумма, максимум]}."""
+    cache = caches[CACHE_ALIAS]
+    merged = {}
+    keys = list(cache.get(PROCESSES_KEY) or {})
+    for snapshot in cache.get_many(keys).values():
+        for key, (count, total, longest) in snapshot.items():
+            entry = merged.setdefault(key, [0, 0.0, 0.0])
+            entry[0] += count
+            entry[1] += total
+            entry[2] = max(entry[2], longest)
+    return merged
+
+
+def reset():
+    cache = caches[CACHE_ALIAS]
+    cache.delete_many(list(cache.get(PROCESSES_KEY) or {}))
+    cache.delete(PROCESSES_KEY)
+    STATS.clear()
+
+
+def origin():
+    """Первый кадр стека из кода проекта, а не Django или библиотек."""
+    base = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()):
+        filename = frame.filename
+        if (filename.startswith(base) and filename not in INSTRUMENTATION
+                and 'site-packages' not in filename):
+            return f'{filename[len(base) + 1:]}:{frame.lineno} in {frame.name}'
+    return None
+
+
+def view_name():
+    request = _request.get()
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else None
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """Обёртка для connection.execute_wrapper."""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        STATS.add(sql, duration)
+        if duration * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+            logger.warning(
+                'Медленный запрос %.1f мс, view %s, %s: %s',
+                duration * 1000, view_name(), origin(), sql,
+            )
+
+
+@contextmanager
+def tracking(request):
+    """Связывает запросы к базе с обрабатываемым HTTP-запросом."""
+    token = _request.set(request)
+    try:
+        yield
+    finally:
+        _request.reset(token)
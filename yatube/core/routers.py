@@ -0,0 +1,73 @@
+"""Чтение из реплик для view, которые ничего не пишут.
+
+Реплики перечислены в DATABASE_REPLICAS. В реплику уходят только
+чтения внутри view из REPLICA_VIEWS (метки ставит
+ReplicaRoutingMiddleware); всё остальное, включая чтения в командах и
+фоновых потоках, идёт в основную базу.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY = 'default'
+# Сессия, которой ещё нет в реплике, выглядела бы пустой, и
+# SessionMiddleware удалил бы cookie - пользователь вышел бы из системы.
+PRIMARY_ONLY_APPS = ('sessions',)
+
+_state = ContextVar('replica_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+
+
+@contextmanager
+def routing(use_replica):
+    state = RoutingState(use_replica)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def primary():
+    """Чтения внутри блока идут в основную базу."""
+    state = _state.get()
+    if state is None or not state.use_replica:
+        yield
+        return
+    state.use_replica = False
+    try:
+        yield
+    finally:
+        state.use_replica = not state.wrote
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (state is None or not state.use_replica
+                or model._meta.app_label in PRIMARY_ONLY_APPS):
+            return PRIMARY
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # После записи запрос дочитывает данные из основной базы.
+            state.use_replica = False
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
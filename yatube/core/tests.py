@@ -1,4 +1,90 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection, router
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+from core import metrics, querylog
+from core.cache.backends import RedisCache
+from core.db import database_from_url
+from core.middleware import ReplicaRoutingMiddleware
+from posts.cache import bump, versioned_page
+from posts.models import Follow, Post
+
+User = get_user_model()
+
+
+def file_caches(location):
+    return {
+        'default': {
+            'BACKEND': 'core.cache.backends.TwoTierCache',
+            'OPTIONS': {
+                'SHARED': 'shared',
+                'LOCAL_TIMEOUT': 60,
+                'LOCAL_MAX_ENTRIES': 2,
+                'LOCAL_KEY_PREFIXES': ('page:',),
+            },
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location,
+            'KEY_PREFIX': 'yatube',
+        },
+    }
+
+
+class FakeRedis:
+    """Клиент Redis в памяти: только команды, которые вызывает RedisCache."""
+
+    def __init__(self, connection_pool=None):
+        self.data = {}
+
+    @staticmethod
+    def _encode(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = self._encode(value)
+        return True
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def scan_iter(self, match):
+        prefix = match.rstrip('*')
+        return [key for key in list(self.data) if key.startswith(prefix)]
+
+    def register_script(self, script):
+        def incr(keys, args):
+            # Повторяет INCR_SCRIPT.
+            key, delta = keys[0], args[0]
+            if key not in self.data:
+                return None
+            self.data[key] = self._encode(int(self.data[key]) + delta)
+            return int(self.data[key])
+        return incr
 
 
 class ViewTestClass(TestCase):
@@ -6,3 +92,344 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+@override_settings(PERFORMANCE_SAMPLE_RATE=1)
+class PerformanceMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.REGISTRY.clear()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        for name in ('db;dur=', 'tpl;dur=', 'cache;desc="hit 0 miss 1"',
+                     'total;dur='):
+            self.assertIn(name, timing)
+        cached = self.client.get(reverse('posts:index'))
+        self.assertIn('cache;desc="hit 1 miss 0"', cached['Server-Timing'])
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=0)
+    def test_unsampled_request_reports_only_total(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+$')
+
+    def test_histograms_by_url_name(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        labels = 'view="posts:index",method="GET"'
+        self.assertIn(
+            f'yatube_request_duration_seconds_count{{{labels}}} 2', text
+        )
+        self.assertIn(
+            f'yatube_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2',
+            text,
+        )
+        self.assertIn(f'yatube_request_db_queries_count{{{labels}}} 2', text)
+        self.assertIn(
+            'yatube_page_cache_total{view="posts:index",result="hit"} 1', text
+        )
+
+    def test_card_cache_counted_separately(self):
+        author = User.objects.create_user(username='metrics')
+        Post.objects.create(author=author, text='Пост для карточки')
+        response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        self.assertIn('cache;desc="hit 0 miss 1"', timing)
+        self.assertIn('card;desc="hit 0 miss 1"', timing)
+        text = self.client.get('/metrics/').content.decode()
+        self.assertIn(
+            'yatube_card_cache_total{view="posts:index",result="miss"} 1',
+            text,
+        )
+        self.assertIn(
+            'yatube_page_cache_total{view="posts:index",result="miss"} 1',
+            text,
+        )
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_metrics_hidden_from_other_addresses(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 404)
+
+
+class DatabaseConfigTests(TestCase):
+    def test_sqlite_by_default(self):
+        self.assertEqual(database_from_url('', '/srv/db.sqlite3'), {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': '/srv/db.sqlite3',
+        })
+        self.assertEqual(
+            database_from_url('sqlite:////data/yatube.sqlite3', 'x')['NAME'],
+            '/data/yatube.sqlite3',
+        )
+
+    def test_postgres_url(self):
+        config = database_from_url(
+            'postgres://yatube:p%40ss@db:6432/yatube?sslmode=require',
+            'x', conn_max_age=60, pooler=True,
+        )
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(
+            (config['USER'], config['PASSWORD'], config['HOST'],
+             config['PORT'], config['NAME']),
+            ('yatube', 'p@ss', 'db', '6432', 'yatube'),
+        )
+        self.assertEqual(config['CONN_MAX_AGE'], 60)
+        self.assertEqual(config['OPTIONS'], {'sslmode': 'require'})
+        self.assertTrue(config['DISABLE_SERVER_SIDE_CURSORS'])
+
+    def test_unknown_scheme(self):
+        with self.assertRaises(ValueError):
+            database_from_url('mysql://db/yatube', 'x')
+
+    def test_sqlite_pragmas_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(
+                cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout']
+            )
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    def route(self, method, path, write=False, cookies=None):
+        """Базы чтения Post и Session внутри view и ответ middleware."""
+        seen = {}
+
+        def view(request):
+            request.resolver_match = resolve(request.path_info)
+            middleware.process_view(request, None, (), {})
+            if write:
+                router.db_for_write(Follow)
+            seen['post'] = router.db_for_read(Post)
+            seen['session'] = router.db_for_read(Session)
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        request = getattr(RequestFactory(), method)(path)
+        request.COOKIES.update(cookies or {})
+        response = middleware(request)
+        return seen, response.cookies.get(settings.REPLICA_PIN_COOKIE)
+
+    def test_read_only_view_reads_from_replica(self):
+        seen, pin = self.route('get', reverse('posts:index'))
+        self.assertEqual(seen, {'post': 'replica', 'session': 'default'})
+        self.assertIsNone(pin)
+
+    def test_other_views_read_from_primary(self):
+        seen, pin = self.route('get', reverse('posts:post_create'))
+        self.assertEqual(seen['post'], 'default')
+
+    def test_write_pins_user_to_primary(self):
+        seen, pin = self.route(
+            'get', reverse('posts:profile', args=('author',)), write=True
+        )
+        self.assertEqual(seen['post'], 'default')
+        self.assertEqual(pin['max-age'], settings.REPLICA_PIN_SECONDS)
+        seen, pin = self.route('post', reverse('posts:post_create'))
+        self.assertIsNotNone(pin)
+
+    def test_pinned_user_reads_from_primary(self):
+        seen, pin = self.route(
+            'get', reverse('posts:index'),
+            cookies={settings.REPLICA_PIN_COOKIE: '1'},
+        )
+        self.assertEqual(seen['post'], 'default')
+
+    def test_page_cache_miss_reads_from_replica(self):
+        cache.clear()
+        seen = []
+
+        @versioned_page('index')
+        def page(request):
+            seen.append(router.db_for_read(Post))
+            return HttpResponse()
+
+        def view(request):
+            request.resolver_match = resolve(request.path_info)
+            middleware.process_view(request, None, (), {})
+            response = page(request)
+            seen.append(router.db_for_read(Post))
+            return response
+
+        middleware = ReplicaRoutingMiddleware(view)
+        middleware(RequestFactory().get(reverse('posts:index')))
+        self.assertEqual(seen, ['replica', 'replica'])
+        seen.clear()
+        bump('index')
+        middleware(RequestFactory().get(reverse('posts:index')))
+        self.assertEqual(seen, ['default', 'replica'])
+
+    def test_no_replicas_outside_requests(self):
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+
+@override_settings(QUERY_STATS_FLUSH_INTERVAL=0)
+class QueryLogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        querylog.reset()
+
+    def test_fingerprint_drops_values(self):
+        self.assertEqual(
+            querylog.fingerprint(
+                "SELECT  \"t1\".\"id\" FROM t1 WHERE a = 5 AND b = 'x''y' "
+                "AND c IN (%s, %s, %s) LIMIT 10"
+            ),
+            'SELECT "t1"."id" FROM t1 WHERE a = ? AND b = ? '
+            'AND c IN (...) LIMIT ?',
+        )
+        self.assertEqual(
+            querylog.fingerprint('INSERT INTO t VALUES (%s, %s), (%s, %s)'),
+            querylog.fingerprint('INSERT INTO t VALUES (%s, %s)') + ', ...',
+        )
+
+    def test_queries_aggregated_across_requests(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index') + '?page=2')
+        entries = querylog.collected()
+        self.assertTrue(entries)
+        count, total, longest = max(
+            entries.values(), key=lambda entry: entry[0]
+        )
+        self.assertGreaterEqual(count, 2)
+        self.assertGreaterEqual(total, longest)
+        output = StringIO()
+        call_command('top_queries', limit=1, reset=True, stdout=output)
+        self.assertIn('SELECT', output.getvalue())
+        self.assertEqual(querylog.collected(), {})
+
+    def test_stale_processes_pruned(self):
+        shared = caches[querylog.CACHE_ALIAS]
+        expired = time.time() - querylog.SNAPSHOT_TIMEOUT - 1
+        shared.set(querylog.PROCESSES_KEY, {
+            'querystats:gone:1': expired,
+            'querystats:alive:2': time.time(),
+        })
+        querylog.STATS.flush(force=True)
+        self.assertEqual(
+            set(shared.get(querylog.PROCESSES_KEY)),
+            {'querystats:alive:2', querylog.process_key()},
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0, PERFORMANCE_SAMPLE_RATE=1)
+    def test_slow_query_logged_with_view(self):
+        with self.assertLogs('yatube.slow_queries') as logs:
+            self.client.get(reverse('posts:index'))
+        self.assertIn('view posts:index', logs.output[0])
+        self.assertRegex(logs.output[0], r'posts/\w+\.py:\d+ in \w+: ')
+
+
+class TwoTierCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_dir = tempfile.mkdtemp()
+        cls.caches_override = override_settings(
+            CACHES=file_caches(cls.cache_dir)
+        )
+        cls.caches_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.caches_override.disable()
+        shutil.rmtree(cls.cache_dir, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_hot_keys_served_from_local_tier(self):
+        cache.set('page:index', 'страница')
+        caches['shared'].delete('page:index')
+        self.assertEqual(cache.get('page:index'), 'страница')
+        self.assertEqual(cache.get_many(['page:index']), {
+            'page:index': 'страница'
+        })
+
+    def test_other_keys_read_from_shared_tier(self):
+        cache.set('version:index', 1)
+        caches['shared'].set('version:index', 2)
+        self.assertEqual(cache.get('version:index'), 2)
+        self.assertEqual(cache.incr('version:index'), 3)
+        self.assertEqual(caches['shared'].get('version:index'), 3)
+
+    def test_local_tier_is_lru(self):
+        for name in ('first', 'second', 'third'):
+            cache.set(f'page:{name}', name)
+        caches['shared'].clear()
+        self.assertIsNone(cache.get('page:first'))
+        self.assertEqual(cache.get('page:third'), 'third')
+
+    def test_set_many_writes_shared_once(self):
+        shared = caches['shared']
+        with mock.patch.object(
+            type(shared), 'set_many', autospec=True,
+            side_effect=type(shared).set_many,
+        ) as set_many:
+            failed = cache.set_many({'page:index': 'страница', 'bumped:x': 1})
+        self.assertEqual(failed, [])
+        set_many.assert_called_once()
+        self.assertEqual(shared.get('bumped:x'), 1)
+        shared.clear()
+        self.assertEqual(cache.get('page:index'), 'страница')
+        self.assertIsNone(cache.get('bumped:x'))
+
+    def test_local_values_are_copies(self):
+        cache.set('page:list', [1])
+        cache.get('page:list').append(2)
+        self.assertEqual(cache.get('page:list'), [1])
+
+
+class FakeRedisCacheTests(TestCase):
+    def setUp(self):
+        with mock.patch('redis.Redis', FakeRedis):
+            self.cache = RedisCache(
+                'redis://localhost:6379/0', {'KEY_PREFIX': 'yatube-test'}
+            )
+
+    def test_round_trip(self):
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 5))
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        self.assertEqual(self.cache.decr('counter'), 2)
+        self.assertEqual(
+            self.cache.get_many(['key', 'counter', 'missing']),
+            {'key': {'value': 1}, 'counter': 2}
+        )
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_incr_missing_key(self):
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.assertIsNone(self.cache.get('missing'))
+
+
+@skipUnless(os.getenv('REDIS_URL'), 'нужен сервер Redis в REDIS_URL')
+class RedisCacheTests(TestCase):
+    def setUp(self):
+        self.cache = RedisCache(
+            os.getenv('REDIS_URL'), {'KEY_PREFIX': 'yatube-test'}
+        )
+        self.cache.clear()
+
+    def test_round_trip(self):
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 5))
+        self.assertEqual(self.cache.incr('counter'), 2)
+        self.assertEqual(
+            self.cache.get_many(['key', 'counter', 'missing']),
+            {'key': {'value': 1}, 'counter': 2}
+        )
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
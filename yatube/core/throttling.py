@@ -0,0 +1,64 @@
+"""Ограничение частоты действий пользователя по алгоритму token bucket.
+
+Ведро на пользователя и действие хранится в кеше как (жетоны, время).
+Чтение и запись ведра не атомарны: при одновременных запросах одного
+пользователя лимит может быть превышен на пару действий, зато проверка
+стоит одного get и одного set без блокировок.
+"""
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import render
+
+PREFIX = 'throttle'
+
+
+def take(key, capacity, period):
+    """Забирает жетон из ведра key.
+
+    Ведро вмещает capacity жетонов и заполняется целиком за period
+    секунд. Возвращает 0, если жетон был, иначе сколько секунд ждать
+    следующего.
+    """
+    rate = capacity / period
+    now = time.time()
+    tokens, updated = cache.get(key) or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens < 1:
+        return (1 - tokens) / rate
+    cache.set(key, (tokens - 1, now), math.ceil(period))
+    return 0
+
+
+def client_key(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f'ip:{request.META.get("REMOTE_ADDR")}'
+
+
+def too_many_requests(request, wait):
+    return render(request, 'core/429.html', {'wait': wait}, status=429)
+
+
+def throttle(scope, respond=too_many_requests):
+    """Декоратор view: 429 Too Many Requests сверх THROTTLE_RATES[scope].
+
+    respond(request, wait) строит ответ отказа, по умолчанию страницу.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            capacity, period = settings.THROTTLE_RATES[scope]
+            wait = take(
+                f'{PREFIX}:{scope}:{client_key(request)}', capacity, period
+            )
+            if wait:
+                response = respond(request, math.ceil(wait))
+                response['Retry-After'] = math.ceil(wait)
+                return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
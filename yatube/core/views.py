@@ -1,4 +1,7 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from core import metrics
 
 
 def page_not_found(request, exception):
@@ -11,3 +14,17 @@ def server_error(request, *args, **argv):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def prometheus_metrics(request):
+    """Метрики процесса в текстовом формате Prometheus.
+
+    Доступны только с адресов METRICS_ALLOWED_IPS, для остальных
+    адрес не существует.
+    """
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(
+        metrics.REGISTRY.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
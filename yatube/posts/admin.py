@@ -1,32 +1,50 @@
 from django.contrib import admin
 from posts.models import Comment, Follow, Group, Post
+from posts.paginators import EstimatedCountPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список без COUNT(*) по всей таблице.
+
+    Число строк без фильтров оценивается по статистике базы, а второй
+    подсчёт «всего N» при поиске не выполняется.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class PostAdmin(LargeTableAdmin):
 
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    autocomplete_fields = ('author', 'group')
     empty_value_display = '-пусто-'
     list_editable = ('group',)
 
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('pk', 'title', 'slug', 'description')
-    seach_fields = ('description')
+    search_fields = ('title', 'slug')
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = ('text', 'created', 'author', 'post')
+    list_select_related = ('author', 'post')
     search_fields = ('text',)
-    list_filter = ('created', 'author')
+    date_hierarchy = 'created'
+    autocomplete_fields = ('author', 'post')
     empty_value_display = '-пусто-'
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('user', 'author')
-    list_filter = ('user', 'author')
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    autocomplete_fields = ('user', 'author')
 
 
 admin.site.register(Post, PostAdmin)
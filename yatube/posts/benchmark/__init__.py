@@ -0,0 +1,5 @@
+"""Синтетические данные и замеры view ленты на реалистичном объёме.
+
+data - генерация социального графа, runner - замеры latency, числа
+запросов и памяти по каждому view с отчётом в JSON.
+"""
@@ -0,0 +1,162 @@
+import itertools
+import random
+from bisect import bisect
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+from posts import search, timeline
+from posts.bulk import preserved_timestamps
+from posts.counters import recount_all
+from posts.models import Comment, Follow, Group, Post
+from posts.utils import bulk_insert
+
+User = get_user_model()
+
+USERNAME_PREFIX = 'bench_'
+IMAGE_NAMES = [f'posts/benchmark_{number}.jpg' for number in range(8)]
+PASSWORD = 'benchmark'
+
+
+class Weighted:
+    """Выбор по закону Ципфа: вес i-го элемента пропорционален 1 / i^s.
+
+    Немногие популярные авторы получают основную часть подписчиков
+    и постов, как в настоящих социальных сетях.
+    """
+
+    def __init__(self, items, exponent, rng):
+        self.items = items
+        self.rng = rng
+        self.cumulative = list(itertools.accumulate(
+            1 / rank ** exponent for rank in range(1, len(items) + 1)
+        ))
+
+    def choice(self):
+        point = self.rng.random() * self.cumulative[-1]
+        return self.items[bisect(self.cumulative, point)]
+
+    def sample(self, count):
+        """До count разных элементов."""
+        return {self.choice() for _ in range(count)}
+
+
+def ensure_images(size=(1600, 1000)):
+    """Несколько общих картинок для постов: декодировать их не нужно."""
+    for number, name in enumerate(IMAGE_NAMES):
+        if default_storage.exists(name):
+            continue
+        buffer = BytesIO()
+        color = (40 * number % 256, 90, 160)
+        Image.new('RGB', size, color).save(buffer, 'JPEG', quality=85)
+        default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def generate(users=1000, groups=20, posts=20_000, comments=50_000,
+             follows_per_user=30, image_ratio=0.2, exponent=1.1,
+             batch_size=5000, seed=0, log=None):
+    """Создаёт пользователей, группы, подписки, посты и комментарии.
+
+    Все объекты вставляются bulk_create пачками, после чего счётчики,
+    ленты подписок и поисковый индекс пересчитываются целиком. Даты
+    постов распределены по последнему году.
+    """
+    rng = random.Random(seed)
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    log = log or (lambda message: None)
+    password = make_password(PASSWORD)
+
+    start = User.objects.filter(
+        username__startswith=USERNAME_PREFIX
+    ).count()
+    bulk_insert(
+        User,
+        (
+            User(username=f'{USERNAME_PREFIX}{number}', password=password)
+            for number in range(start, start + users)
+        ),
+        batch_size,
+    )
+    user_ids = list(User.objects.filter(
+        username__startswith=USERNAME_PREFIX
+    ).order_by('pk').values_list('pk', flat=True))
+    log(f'Пользователей: {len(user_ids)}')
+
+    Group.objects.bulk_create(
+        Group(
+            title=f'Группа {number} {fake.word()}',
+            slug=f'{USERNAME_PREFIX}{start}_{number}',
+            description=fake.sentence(),
+        )
+        for number in range(groups)
+    )
+    group_ids = list(Group.objects.values_list('pk', flat=True))
+
+    popular = Weighted(user_ids, exponent, rng)
+    bulk_insert(
+        Follow,
+        (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in popular.sample(follows_per_user)
+            if author_id != user_id
+        ),
+        batch_size,
+        ignore_conflicts=True,
+    )
+    log(f'Подписок: {Follow.objects.count()}')
+
+    ensure_images()
+    now = timezone.now()
+    year = 365 * 24 * 60 * 60
+    with preserved_timestamps(Post):
+        bulk_insert(
+            Post,
+            (
+                Post(
+                    author_id=popular.choice(),
+                    group_id=(
+                        rng.choice(group_ids)
+                        if group_ids and rng.random() < 0.5 else None
+                    ),
+                    text=fake.paragraph(nb_sentences=rng.randint(1, 6)),
+                    image=(
+                        rng.choice(IMAGE_NAMES)
+                        if rng.random() < image_ratio else ''
+                    ),
+                    pub_date=now - timedelta(seconds=rng.random() * year),
+                )
+                for _ in range(posts)
+            ),
+            batch_size,
+        )
+    log(f'Постов: {Post.objects.count()}')
+
+    post_ids = list(Post.objects.order_by('-pk').values_list('pk', flat=True))
+    if post_ids:
+        hot_posts = Weighted(post_ids, exponent, rng)
+        bulk_insert(
+            Comment,
+            (
+                Comment(
+                    post_id=hot_posts.choice(),
+                    author_id=rng.choice(user_ids),
+                    text=fake.sentence(),
+                )
+                for _ in range(comments)
+            ),
+            batch_size,
+        )
+    log(f'Комментариев: {Comment.objects.count()}')
+
+    recount_all()
+    timeline.rebuild()
+    search.rebuild()
+    log('Счётчики, ленты и поисковый индекс пересчитаны')
@@ -0,0 +1,234 @@
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from posts.benchmark.data import USERNAME_PREFIX
+from posts.models import Group, Post, User
+
+VIEWS = (
+    'index', 'group_posts', 'profile', 'post_detail', 'follow_index',
+    'add_comment',
+)
+
+# Ёмкость ведра, которую замер не исчерпает.
+UNLIMITED = 10 ** 9
+
+
+def unthrottled():
+    """Снимает лимиты THROTTLE_RATES на время замера.
+
+    Замер add_comment отправляет сотни комментариев от одного
+    пользователя, а с тёплым кешем ведро не сбрасывается между
+    запросами: без этого он упирается в 429.
+    """
+    return override_settings(THROTTLE_RATES={
+        scope: (UNLIMITED, 1) for scope in settings.THROTTLE_RATES
+    })
+
+
+def percentile(values, fraction):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(values):
+    return {
+        'p50': percentile(values, 0.50),
+        'p95': percentile(values, 0.95),
+        'p99': percentile(values, 0.99),
+        'max': max(values),
+    }
+
+
+class Targets:
+    """Реальные объекты данных, по которым ходят замеры.
+
+    Авторы и посты выбираются случайно, но с фиксированным seed, так что
+    при повторе на той же базе запросы совпадают.
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+        users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        self.viewer = users.annotate(
+            follows=Count('follower')
+        ).order_by('-follows').first() or User.objects.first()
+        self.usernames = list(users.values_list('username', flat=True)[:500])
+        self.slugs = list(Group.objects.values_list('slug', flat=True)[:200])
+        self.post_ids = list(
+            Post.objects.order_by('-pub_date').values_list('pk', flat=True)[
+                :1000
+            ]
+        )
+
+    def page(self):
+        return {'page': self.rng.randint(1, 5)}
+
+    def request(self, view):
+        """(метод, url, данные) одного запроса к view."""
+        if view == 'index':
+            return 'get', reverse('posts:index'), self.page()
+        if view == 'group_posts':
+            slug = self.rng.choice(self.slugs)
+            return 'get', reverse('posts:group_list', args=(slug,)), (
+                self.page()
+            )
+        if view == 'profile':
+            username = self.rng.choice(self.usernames)
+            return 'get', reverse('posts:profile', args=(username,)), (
+                self.page()
+            )
+        if view == 'follow_index':
+            return 'get', reverse('posts:follow_index'), self.page()
+        post_id = self.rng.choice(self.post_ids)
+        if view == 'post_detail':
+            return 'get', reverse('posts:post_detail', args=(post_id,)), {}
+        return 'post', reverse('posts:add_comment', args=(post_id,)), {
+            'text': 'Комментарий из бенчмарка'
+        }
+
+    def available(self, view):
+        if view == 'group_posts':
+            return bool(self.slugs)
+        if view == 'profile':
+            return bool(self.usernames)
+        if view in ('post_detail', 'add_comment'):
+            return bool(self.post_ids)
+        return self.viewer is not None
+
+
+def measure(client, method, url, data):
+    """Время ответа в мс и число запросов к базе."""
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = getattr(client, method)(url, data)
+        elapsed = time.perf_counter() - started
+    if response.status_code >= 400:
+        raise RuntimeError(f'{url}: ответ {response.status_code}')
+    return elapsed * 1000, len(queries)
+
+
+def measure_memory(client, method, url, data):
+    """Пик памяти Python за запрос в КБ.
+
+    tracemalloc замедляет код в разы, поэтому память меряется отдельными
+    запросами, не попадающими в замеры времени.
+    """
+    tracemalloc.start()
+    try:
+        getattr(client, method)(url, data)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def run(views=VIEWS, requests=200, warmup=10, memory_requests=20,
+        cold_cache=False, seed=0, log=None):
+    """Замеряет каждый view и возвращает отчёт в виде словаря.
+
+    cold_cache - перед каждым запросом кеш очищается, так что меряется
+    путь рендера, а не выдача из кеша страниц. Комментарии, созданные
+    замером add_comment, остаются в базе.
+    """
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    targets = Targets(rng)
+    # Адрес не из INTERNAL_IPS: debug_toolbar не участвует в замерах.
+    client = Client(REMOTE_ADDR='192.0.2.1')
+    if targets.viewer is not None:
+        client.force_login(targets.viewer)
+    results = {}
+    with unthrottled():
+        for view in views:
+            if not targets.available(view):
+                log(f'{view}: нет данных, пропущен')
+                continue
+            timings, queries, memory = [], [], []
+            for number in range(warmup + requests):
+                if cold_cache:
+                    cache.clear()
+                elapsed, query_count = measure(client, *targets.request(view))
+                if number >= warmup:
+                    timings.append(elapsed)
+                    queries.append(query_count)
+            for _ in range(memory_requests):
+                if cold_cache:
+                    cache.clear()
+                memory.append(measure_memory(client, *targets.request(view)))
+            result = results[view] = {
+                'requests': requests,
+                'latency_ms': summarize(timings),
+                'queries': summarize(queries),
+                'memory_kb': summarize(memory) if memory else None,
+            }
+            log(
+                f'{view:>14}: p50 {result["latency_ms"]["p50"]:.1f} мс, '
+                f'p99 {result["latency_ms"]["p99"]:.1f} мс, '
+                f'запросов {result["queries"]["p50"]}'
+            )
+    return {
+        'meta': meta(cold_cache, requests, seed),
+        'data': {
+            'users': User.objects.count(),
+            'groups': Group.objects.count(),
+            'posts': Post.objects.count(),
+        },
+        'views': results,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def meta(cold_cache, requests, seed):
+    return {
+        'commit': git_commit(),
+        'created': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'debug': settings.DEBUG,
+        'database': connection.vendor,
+        'cache': settings.CACHES['default']['BACKEND'],
+        'cold_cache': cold_cache,
+        'requests': requests,
+        'seed': seed,
+    }
+
+
+def compare(previous, current):
+    """Строки сравнения p50/p95 и числа запросов с прошлым отчётом."""
+    lines = []
+    for view, result in current['views'].items():
+        before = previous.get('views', {}).get(view)
+        if not before:
+            continue
+        changes = []
+        for metric, key in (('latency_ms', 'p50'), ('latency_ms', 'p95'),
+                            ('queries', 'p50')):
+            old, new = before[metric][key], result[metric][key]
+            delta = (new - old) / old * 100 if old else 0
+            changes.append(f'{metric}.{key} {old:.1f} → {new:.1f} '
+                           f'({delta:+.0f}%)')
+        lines.append(f'{view:>14}: ' + ', '.join(changes))
+    return lines
@@ -0,0 +1,100 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.template import Context, Engine
+from django.template.backends.django import get_installed_libraries
+from django.utils import timezone
+from posts.benchmark.runner import summarize
+from posts.models import Group, Post
+
+User = get_user_model()
+
+SIZES = (10, 50, 100)
+LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+# Строки ленты: {% include %} на каждой итерации, inclusion tag с тем
+# же шаблоном карточки и карточки из кеша фрагментов (после первого
+# рендера - только get_many).
+ROWS = {
+    'include': (
+        '{% for post in posts %}'
+        "{% include 'posts/includes/post_list.html' "
+        'with eager=forloop.first group_link=True %}'
+        '{% endfor %}'
+    ),
+    'tag': (
+        '{% load post_cards %}'
+        '{% for post in posts %}'
+        '{% post_card post eager=forloop.first %}'
+        '{% endfor %}'
+    ),
+    'fragments': (
+        '{% load post_cards %}'
+        '{% post_cards posts as cards %}'
+        '{% for card in cards %}{{ card }}{% endfor %}'
+    ),
+}
+
+
+def engine(cached):
+    loaders = [('django.template.loaders.locmem.Loader', ROWS)] + LOADERS
+    if cached:
+        loaders = [('django.template.loaders.cached.Loader', loaders)]
+    return Engine(
+        dirs=settings.TEMPLATES[0]['DIRS'],
+        loaders=loaders,
+        libraries=get_installed_libraries(),
+    )
+
+
+def make_posts(count):
+    """Посты в памяти, без базы: меряется только рендер."""
+    author = User(pk=1, username='benchmark', first_name='Имя',
+                  last_name='Фамилия')
+    group = Group(pk=1, title='Группа', slug='benchmark')
+    now = timezone.now()
+    return [
+        Post(
+            pk=number,
+            text=f'Текст поста {number} ' * 10,
+            pub_date=now,
+            updated_at=now,
+            author=author,
+            group=group if number % 2 else None,
+            comments_count=number,
+        )
+        for number in range(1, count + 1)
+    ]
+
+
+def render(engine, name, posts):
+    started = time.perf_counter()
+    engine.get_template(name).render(Context({'posts': posts}))
+    return (time.perf_counter() - started) * 1000
+
+
+def run(sizes=SIZES, repeat=50):
+    """Время рендера страницы ленты из sizes постов, мс.
+
+    Для каждого размера замеряются варианты из ROWS с обычными
+    загрузчиками (шаблоны читаются и компилируются при каждом рендере) и
+    с cached.Loader. Первый рендер прогревает кеш загрузчика и кеш
+    карточек и в замер не входит.
+    """
+    report = {}
+    for size in sizes:
+        posts = make_posts(size)
+        results = {}
+        for loader, cached in (('plain', False), ('cached', True)):
+            current = engine(cached)
+            for row in ROWS:
+                render(current, row, posts)
+                timings = [
+                    render(current, row, posts) for _ in range(repeat)
+                ]
+                results[f'{loader}/{row}'] = summarize(timings)
+        report[size] = results
+    return report
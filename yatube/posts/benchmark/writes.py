@@ -0,0 +1,75 @@
+import random
+import threading
+import time
+
+from django.db import OperationalError, connection
+from posts.benchmark.runner import summarize
+from posts.models import Comment, Post, User
+
+
+def journal_mode():
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        return cursor.fetchone()[0]
+
+
+def run(threads=8, writes=200, seed=0):
+    """Параллельная запись комментариев из threads потоков.
+
+    Каждый поток открывает своё соединение и делает writes вставок через
+    ORM, со всеми сигналами (счётчики, поисковый индекс), как add_comment.
+    Ошибки database is locked считаются, а не прерывают замер.
+    """
+    post_ids = list(
+        Post.objects.order_by('-pk').values_list('pk', flat=True)[:1000]
+    )
+    user_ids = list(User.objects.values_list('pk', flat=True)[:1000])
+    if not post_ids or not user_ids:
+        raise ValueError('Нет постов или пользователей для записи')
+    timings, errors = [], []
+    lock = threading.Lock()
+
+    def write(number):
+        rng = random.Random(seed + number)
+        local_timings, local_errors = [], 0
+        try:
+            for _ in range(writes):
+                started = time.perf_counter()
+                try:
+                    Comment.objects.create(
+                        post_id=rng.choice(post_ids),
+                        author_id=rng.choice(user_ids),
+                        text='Комментарий из замера записи',
+                    )
+                except OperationalError:
+                    local_errors += 1
+                    continue
+                local_timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            connection.close()
+        with lock:
+            timings.extend(local_timings)
+            errors.append(local_errors)
+
+    workers = [
+        threading.Thread(target=write, args=(number,))
+        for number in range(threads)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'vendor': connection.vendor,
+        'journal_mode': journal_mode(),
+        'threads': threads,
+        'writes': len(timings),
+        'errors': sum(errors),
+        'seconds': elapsed,
+        'writes_per_second': len(timings) / elapsed,
+        'latency_ms': summarize(timings) if timings else None,
+    }
@@ -0,0 +1,286 @@
+import csv
+import json
+import os
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from posts import search, timeline
+from posts.cache import GROUPS, POSTS, PROFILES, bump
+from posts.counters import recount_all
+from posts.models import Comment, Follow, Group, Post
+from posts.utils import batches
+
+User = get_user_model()
+FORMATS = ('jsonl', 'csv')
+# Сколько затронутых страниц загрузка запоминает поимённо.
+TRACK_LIMIT = 1000
+# Колонки выгрузки: первичные и внешние ключи как есть, чтобы строки
+# вставлялись без поиска связанных объектов.
+MODELS = {
+    'group': (Group, ('id', 'title', 'slug', 'description')),
+    'post': (
+        Post, ('id', 'text', 'pub_date', 'author_id', 'group_id', 'image')
+    ),
+    'comment': (Comment, ('id', 'text', 'created', 'author_id', 'post_id')),
+    'follow': (Follow, ('id', 'user_id', 'author_id')),
+}
+
+
+def guess_format(path):
+    return 'csv' if path.endswith('.csv') else 'jsonl'
+
+
+def _to_text(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+# Выгрузка постов автора для него самого: группа - slug, без ключей.
+AUTHOR_POST_FIELDS = ('id', 'text', 'pub_date', 'updated_at', 'group', 'image')
+
+
+def export_author_posts(author_id, batch_size):
+    """Все посты автора от новых к старым, не больше batch_size в памяти."""
+    rows = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-pk'
+    ).values_list(
+        'pk', 'text', 'pub_date', 'updated_at', 'group__slug', 'image'
+    ).iterator(chunk_size=batch_size)
+    for row in rows:
+        yield dict(zip(AUTHOR_POST_FIELDS, map(_to_text, row)))
+
+
+def export_rows(model_name, batch_size):
+    """Строки таблицы по возрастанию pk, не больше batch_size в памяти."""
+    model, fields = MODELS[model_name]
+    rows = model.objects.order_by('pk').values_list(*fields).iterator(
+        chunk_size=batch_size
+    )
+    for row in rows:
+        yield dict(zip(fields, map(_to_text, row)))
+
+
+class _Line:
+    """Файл для csv.writer, который отдаёт записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def format_rows(data_format, fields, rows):
+    """Строки выгрузки текстом, по одной, для потоковых ответов."""
+    if data_format == 'csv':
+        writer = csv.DictWriter(_Line(), fieldnames=fields)
+        yield writer.writeheader()
+        for row in rows:
+            yield writer.writerow(row)
+        return
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def write_rows(stream, data_format, fields, rows):
+    """Пишет строки в поток; возвращает их число."""
+    written = 0
+    lines = format_rows(data_format, fields, rows)
+    if data_format == 'csv':
+        stream.write(next(lines))
+    for line in lines:
+        stream.write(line)
+        written += 1
+    return written
+
+
+def read_rows(stream, data_format):
+    if data_format == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _build(model, fields):
+    """Функция, собирающая объект модели из прочитанной строки."""
+    columns = [(name, model._meta.get_field(name)) for name in fields]
+
+    def build(row):
+        values = {}
+        for name, field in columns:
+            if name not in row:
+                continue
+            value = row[name]
+            if value == '' and field.null:
+                value = None
+            values[field.attname] = field.to_python(value)
+        return model(**values)
+    return build
+
+
+@contextmanager
+def preserved_timestamps(model):
+    """Не даёт auto_now_add затереть даты из файла при bulk_create."""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Checkpoint:
+    """Число уже записанных строк файла в соседнем файле .checkpoint."""
+
+    def __init__(self, path):
+        self.path = f'{path}.checkpoint'
+
+    def load(self):
+        try:
+            with open(self.path) as checkpoint:
+                return json.load(checkpoint)['rows']
+        except FileNotFoundError:
+            return 0
+
+    def save(self, rows):
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as checkpoint:
+            json.dump({'rows': rows}, checkpoint)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ImportResult:
+    """Итог загрузки: строки, новые и пропущенные, затронутые страницы.
+
+    Страницы запоминаются, пока их не больше TRACK_LIMIT; дальше
+    загрузка сбрасывает общие версии групп, профилей и постов, чтобы
+    память не росла с размером файла.
+    """
+
+    def __init__(self, model_name, done):
+        self.model_name = model_name
+        self.done = done
+        self.inserted = 0
+        self.skipped = 0
+        self.coarse = False
+        self.user_ids = set()
+        self.group_ids = set()
+        self.post_ids = set()
+        self.group_slugs = set()
+
+    def tracked(self):
+        return (
+            len(self.user_ids) + len(self.group_ids)
+            + len(self.post_ids) + len(self.group_slugs)
+        )
+
+    def track(self, obj):
+        if self.coarse:
+            return
+        if self.model_name == 'post':
+            self.user_ids.add(obj.author_id)
+            self.group_ids.add(obj.group_id)
+        elif self.model_name == 'comment':
+            self.post_ids.add(obj.post_id)
+        elif self.model_name == 'follow':
+            self.user_ids.update((obj.user_id, obj.author_id))
+        elif self.model_name == 'group':
+            self.group_slugs.add(obj.slug)
+        if self.tracked() > TRACK_LIMIT:
+            self.coarse = True
+            for ids in (self.user_ids, self.group_ids, self.post_ids,
+                        self.group_slugs):
+                ids.clear()
+
+    def pages(self):
+        """Версии страниц, на которых видны загруженные строки."""
+        if self.coarse:
+            return ['index', GROUPS, PROFILES, POSTS]
+        names = {'index'}
+        names.update(f'post:{pk}' for pk in self.post_ids if pk)
+        names.update(f'group:{slug}' for slug in self.group_slugs)
+        for ids in batches(filter(None, self.group_ids), 500):
+            names.update(
+                f'group:{slug}' for slug in Group.objects.filter(
+                    pk__in=ids
+                ).values_list('slug', flat=True)
+            )
+        for ids in batches(filter(None, self.user_ids), 500):
+            names.update(
+                f'profile:{username}' for username in User.objects.filter(
+                    pk__in=ids
+                ).values_list('username', flat=True)
+            )
+        return sorted(names)
+
+
+def _insert(model, batch):
+    """bulk_create с ignore_conflicts; возвращает число новых строк.
+
+    База не сообщает, какие строки пропущены, поэтому новые строки
+    ищутся по индексу: строки с pk из файла - по pk, без pk - выше
+    прежнего наибольшего pk.
+    """
+    pks = [obj.pk for obj in batch if obj.pk is not None]
+    existing = model.objects.filter(pk__in=pks).count() if pks else 0
+    top = model.objects.aggregate(top=Max('pk'))['top'] or 0
+    model.objects.bulk_create(batch, ignore_conflicts=True)
+    return model.objects.filter(
+        Q(pk__gt=top) | Q(pk__in=pks)
+    ).count() - existing
+
+
+def import_rows(model_name, rows, batch_size, skip=0, on_batch=None):
+    """Вставляет строки пачками по batch_size, каждая в своей транзакции.
+
+    Первые skip строк пропускаются (продолжение прерванного импорта).
+    Уже существующие строки пропускаются базой, поэтому повтор пачки,
+    записанной до сбоя, безопасен. on_batch(rows_done) вызывается после
+    коммита каждой пачки. Сигналы при bulk_create не срабатывают -
+    счётчики, ленты, поиск и кеш страниц обновляет refresh_derived.
+    """
+    model, fields = MODELS[model_name]
+    build = _build(model, fields)
+    result = ImportResult(model_name, skip)
+    with preserved_timestamps(model):
+        pending = (build(row) for row in islice(rows, skip, None))
+        for batch in batches(pending, batch_size):
+            with transaction.atomic():
+                inserted = _insert(model, batch)
+            result.done += len(batch)
+            result.inserted += inserted
+            result.skipped += len(batch) - inserted
+            for obj in batch:
+                result.track(obj)
+            if on_batch:
+                on_batch(result.done)
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [model]):
+            cursor.execute(sql)
+    return result
+
+
+def refresh_derived(model_name, pages=('index',)):
+    """Пересчитывает то, что обычно поддерживают сигналы.
+
+    pages - версии страниц с загруженными строками
+    (ImportResult.pages()); страницы строк, записанных до --resume,
+    обновятся по PAGE_CACHE_TIMEOUT.
+    """
+    recount_all()
+    if model_name in ('post', 'follow'):
+        timeline.rebuild()
+    if model_name in ('post', 'comment', 'group'):
+        search.rebuild()
+    bump(*pages)
@@ -0,0 +1,278 @@
+import hashlib
+import time
+from contextlib import nullcontext
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from core.metrics import record_cache
+from core.routers import primary
+
+VERSION_PREFIX = 'version'
+BUMPED_PREFIX = 'bumped'
+MODIFIED_PREFIX = 'modified'
+# Общие версии всех страниц групп, профилей и постов: их сбрасывает
+# загрузка, затронувшая слишком много страниц, чтобы перечислить их.
+GROUPS = 'groups'
+PROFILES = 'profiles'
+POSTS = 'posts'
+PAGE_PREFIX = 'page'
+CARD_PREFIX = 'card'
+# Параметры запроса, от которых зависит содержимое страницы.
+KEY_PARAMS = ('page', 'cursor', 'comments', 'format')
+
+
+def name_key(prefix, name):
+    """Ключ для имени версии вида 'group:<slug>'.
+
+    Slug и имя пользователя могут содержать пробелы и не-ASCII символы,
+    которые memcached не принимает, поэтому после вида идёт их хеш.
+    """
+    kind, _, value = name.partition(':')
+    if not value:
+        return f'{prefix}:{kind}'
+    return f'{prefix}:{kind}:{hashlib.md5(value.encode()).hexdigest()}'
+
+
+def version_key(name):
+    return name_key(VERSION_PREFIX, name)
+
+
+def bumped_key(name):
+    return name_key(BUMPED_PREFIX, name)
+
+
+def modified_key(name):
+    return name_key(MODIFIED_PREFIX, name)
+
+
+def get_versions(names):
+    """Возвращает текущие версии зависимостей одним get_many.
+
+    Отсутствующая (вытесненная) версия создаётся заново значением от
+    текущего времени, чтобы не совпасть с версией, сохранённой раньше.
+    """
+    keys = {version_key(name): name for name in names}
+    versions = get_or_add_many(keys, time.time_ns)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def get_or_add_many(keys, default):
+    """Значения ключей одним get_many, недостающие - из default()."""
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, default(), None)
+            values[key] = cache.get(key)
+    return values
+
+
+def last_modified(names):
+    """Время последнего bump() среди версий, в секундах.
+
+    Версия - счётчик и даты не хранит, поэтому bump() записывает время
+    рядом. Вытесненное время заменяется текущим: клиент лишний раз
+    получит ответ целиком, но не устаревший.
+    """
+    keys = [modified_key(name) for name in names]
+    return max(get_or_add_many(keys, lambda: int(time.time())).values())
+
+
+def bump(*names):
+    """Инвалидирует все страницы, зависящие от перечисленных версий.
+
+    С репликами версия ещё REPLICA_PIN_SECONDS помечается как свежая:
+    реплика может не успеть получить запись, сменившую версию.
+    """
+    for name in names:
+        key = version_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+    if names:
+        now = int(time.time())
+        cache.set_many({modified_key(name): now for name in names}, None)
+    if settings.DATABASE_REPLICAS and names:
+        cache.set_many(
+            {bumped_key(name): True for name in names},
+            settings.REPLICA_PIN_SECONDS,
+        )
+
+
+def recently_bumped(names):
+    if not settings.DATABASE_REPLICAS or not names:
+        return False
+    return bool(cache.get_many([bumped_key(name) for name in names]))
+
+
+def viewer_key(request):
+    """Аноним или конкретная сессия вошедшего пользователя.
+
+    Шапка и формы страницы зависят от пользователя и CSRF-токена,
+    поэтому авторизованному пользователю кеш выдаётся по его сессии.
+    Cookie сессии сверяется с хранилищем сессий: с истёкшей или
+    подделанной cookie страница та же, что у анонима, и случайные
+    значения cookie не плодят записей в кеше.
+    """
+    session = getattr(request, 'session', None)
+    if (session is None
+            or settings.SESSION_COOKIE_NAME not in request.COOKIES
+            or not session.get(SESSION_KEY)):
+        return 'anonymous'
+    return hashlib.md5(session.session_key.encode()).hexdigest()
+
+
+def page_key(request):
+    """Ключ страницы: view, путь, параметры из KEY_PARAMS и зритель.
+
+    Остальные параметры строки запроса view не читают, поэтому
+    ?x=1, ?x=2 и так далее получают ту же запись.
+    """
+    params = urlencode([
+        (name, request.GET.get(name))
+        for name in KEY_PARAMS if name in request.GET
+    ])
+    raw = ':'.join((
+        request.resolver_match.view_name,
+        request.path,
+        params,
+        viewer_key(request),
+    ))
+    return f'{PAGE_PREFIX}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def add_dependencies(request, *names):
+    """Добавляет зависимости, известные только после запроса к базе."""
+    dependencies = getattr(request, 'cache_dependencies', None)
+    if dependencies is not None:
+        dependencies.update(get_versions(names))
+
+
+def card_key(post, eager, group_link):
+    """Ключ карточки поста в ленте.
+
+    Меняется вместе со всем, что видно в карточке: правка поста и
+    готовые миниатюры двигают updated_at, комментарии - счётчик, а имя
+    автора и slug группы входят в ключ сами.
+    """
+    raw = repr((
+        post.updated_at.isoformat(),
+        post.comments_count,
+        post.author.username,
+        post.author.get_full_name(),
+        post.group.slug if group_link and post.group_id else None,
+        eager,
+        group_link,
+    ))
+    return f'{CARD_PREFIX}:{post.pk}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def versions_etag(key, versions):
+    """ETag из ключа страницы и версий её зависимостей."""
+    raw = repr((key, sorted(versions.items())))
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def add_validators(request, response, key):
+    """ETag, Last-Modified и Cache-Control для сохраняемой страницы.
+
+    Анониму страница одинакова для всех - её можно держать в CDN и
+    браузере PAGE_MAX_AGE секунд. Страница с сессией личная: браузер
+    хранит её, но каждый раз переспрашивает, и обычно получает 304.
+    """
+    response['ETag'] = versions_etag(key, request.cache_dependencies)
+    response['Last-Modified'] = http_date()
+    if viewer_key(request) == 'anonymous':
+        patch_cache_control(
+            response, public=True, max_age=settings.PAGE_MAX_AGE
+        )
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+
+
+def conditional(request, response):
+    """304 Not Modified, если у клиента та же версия страницы."""
+    return get_conditional_response(
+        request,
+        etag=response['ETag'],
+        last_modified=parse_http_date_safe(response['Last-Modified']),
+        response=response,
+    )
+
+
+def versioned_page(*dependencies):
+    """Кеширует страницу целиком до изменения её зависимостей.
+
+    dependencies - шаблоны имён версий, подставляются из kwargs view,
+    например 'group:{slug}'. При попадании страница отдаётся без единого
+    запроса к базе, при промахе версии запоминаются до рендера, так что
+    изменение, пришедшее во время рендера, не закрепится в кеше.
+    Промах рендерится из реплики, если роутер её выбрал, и только сразу
+    после смены версии - из основной базы: отстающая реплика могла ещё
+    не получить эту запись, и устаревшая страница закрепилась бы в кеше
+    под новой версией. ETag строится из тех же
+    версий, поэтому повторный запрос браузера с If-None-Match или
+    If-Modified-Since получает 304 без тела.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            key = page_key(request)
+            names = [name.format(**kwargs) for name in dependencies]
+            cached = cache.get(key)
+            if cached is not None:
+                versions, response = cached
+                if versions == get_versions(versions):
+                    record_cache(hit=True)
+                    return conditional(request, response)
+            record_cache(hit=False)
+            request.cache_dependencies = get_versions(names)
+            fresh = recently_bumped(names)
+            with primary() if fresh else nullcontext():
+                response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                add_validators(request, response, key)
+                cache.set(
+                    key,
+                    (request.cache_dependencies, response),
+                    settings.PAGE_CACHE_TIMEOUT,
+                )
+                return conditional(request, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def versioned_etag(*dependencies):
+    """ETag из версий зависимостей для ответов, которые не кешируются.
+
+    Потоковый ответ нельзя сохранить как страницу, но его можно не
+    строить: совпавший If-None-Match получает 304 без запросов к базе.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            versions = get_versions(
+                [name.format(**kwargs) for name in dependencies]
+            )
+            request.cache_dependencies = versions
+            tag = versions_etag(page_key(request), versions)
+            response = get_conditional_response(request, etag=tag)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = tag
+            return response
+        return wrapper
+    return decorator
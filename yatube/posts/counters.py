@@ -0,0 +1,81 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from posts.models import Comment, Follow, Group, Post, User, UserCounter
+from posts.utils import bulk_insert
+
+
+def count_of(queryset, field):
+    """Подзапрос COUNT(*) по связанной модели для массового UPDATE."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        Value(0),
+    )
+
+
+def shift(queryset, **deltas):
+    """Атомарно сдвигает счётчики через F(), не опускаясь ниже нуля."""
+    return queryset.update(**{
+        name: Greatest(F(name) + delta, Value(0))
+        for name, delta in deltas.items()
+    })
+
+
+def recount_user(user_id):
+    counter, _ = UserCounter.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'posts_count': Post.objects.filter(author_id=user_id).count(),
+            'followers_count': Follow.objects.filter(
+                author_id=user_id
+            ).count(),
+            'following_count': Follow.objects.filter(
+                user_id=user_id
+            ).count(),
+        },
+    )
+    return counter
+
+
+def shift_user(user_id, create=True, **deltas):
+    """Сдвигает счётчики пользователя.
+
+    Если строки счётчиков ещё нет, она создаётся пересчётом. При удалении
+    (create=False) строку не создаём: пользователь может удаляться
+    каскадом в той же транзакции.
+    """
+    if not shift(UserCounter.objects.filter(user_id=user_id), **deltas):
+        if create:
+            recount_user(user_id)
+
+
+def get_user_counter(user):
+    try:
+        return user.counter
+    except UserCounter.DoesNotExist:
+        return recount_user(user.pk)
+
+
+def recount_all():
+    """Пересчитывает все денормализованные счётчики несколькими UPDATE."""
+    bulk_insert(
+        UserCounter,
+        (
+            UserCounter(user_id=user_id)
+            for user_id in User.objects.filter(
+                counter__isnull=True
+            ).values_list('pk', flat=True).iterator()
+        ),
+    )
+    UserCounter.objects.update(
+        posts_count=count_of(Post.objects, 'author'),
+        followers_count=count_of(Follow.objects, 'author'),
+        following_count=count_of(Follow.objects, 'user'),
+    )
+    Group.objects.update(posts_count=count_of(Post.objects, 'group'))
+    Post.objects.update(comments_count=count_of(Comment.objects, 'post'))
@@ -0,0 +1,64 @@
+from django.db import connections, router, transaction
+from django.db.models.signals import post_delete, post_save
+from posts.models import Follow
+
+
+def follow(user_id, author_id):
+    """Подписка одним INSERT, повтор игнорирует база по unique_pair.
+
+    Сигналы (счётчики, лента, кеш профилей) отправляются вручную и
+    только если строка действительно добавлена. Возвращает True при
+    новой подписке.
+    """
+    using = router.db_for_write(Follow)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    sql = '{} {} ({}, {}) VALUES (%s, %s){}'.format(
+        connection.ops.insert_statement(ignore_conflicts=True),
+        quote(Follow._meta.db_table),
+        quote('user_id'),
+        quote('author_id'),
+        connection.ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+    )
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, (user_id, author_id))
+            created = cursor.rowcount == 1
+        if created:
+            post_save.send(
+                Follow,
+                instance=Follow(user_id=user_id, author_id=author_id),
+                created=True,
+                update_fields=None,
+                raw=False,
+                using=using,
+            )
+    return created
+
+
+def unfollow(user_id, author_id):
+    """Отписка одним DELETE без предварительного SELECT.
+
+    QuerySet.delete() при подключённых сигналах сначала выбирает строки,
+    поэтому удаление идёт напрямую, а post_delete отправляется по числу
+    удалённых строк. Возвращает True, если подписка была.
+    """
+    using = router.db_for_write(Follow)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    sql = 'DELETE FROM {} WHERE {} = %s AND {} = %s'.format(
+        quote(Follow._meta.db_table),
+        quote('user_id'),
+        quote('author_id'),
+    )
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, (user_id, author_id))
+            deleted = cursor.rowcount
+        if deleted:
+            post_delete.send(
+                Follow,
+                instance=Follow(user_id=user_id, author_id=author_id),
+                using=using,
+            )
+    return bool(deleted)
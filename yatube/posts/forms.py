@@ -1,4 +1,8 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
+from posts.images import normalize_image
 from posts.models import Post, Comment
 
 
@@ -7,6 +11,30 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, oversized=(), **kwargs):
+        """oversized - поля, файлы которых отброшены при приёме."""
+        super().__init__(*args, **kwargs)
+        self.oversized = oversized
+
+    def size_limit_error(self):
+        return forms.ValidationError(
+            'Файл больше %(limit)s.',
+            code='file_too_large',
+            params={
+                'limit': filesizeformat(settings.IMAGE_MAX_UPLOAD_SIZE),
+            },
+        )
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if 'image' in self.oversized:
+            raise self.size_limit_error()
+        if not isinstance(image, UploadedFile):
+            return image
+        if image.size > settings.IMAGE_MAX_UPLOAD_SIZE:
+            raise self.size_limit_error()
+        return normalize_image(image)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,88 @@
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from PIL import Image, ImageOps
+
+# Ключи Image.info, которые не нужны для показа и не должны публиковаться:
+# EXIF с координатами и моделью камеры, XMP, комментарии.
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment', 'photoshop')
+
+
+def has_metadata(image):
+    return any(key in image.info for key in METADATA_KEYS)
+
+
+def has_alpha(image):
+    return (
+        image.mode in ('RGBA', 'LA', 'PA')
+        or 'transparency' in image.info
+    )
+
+
+def needs_normalizing(image, size):
+    max_dimension = settings.IMAGE_MAX_DIMENSION
+    return (
+        max(image.size) > max_dimension
+        or size > settings.IMAGE_REENCODE_SIZE
+        or has_metadata(image)
+    )
+
+
+def _encode(image, output):
+    """Сохраняет картинку, возвращает расширение файла.
+
+    Фотографии становятся прогрессивным JPEG, картинки с прозрачностью -
+    оптимизированным PNG.
+    """
+    if has_alpha(image):
+        image.convert('RGBA').save(output, 'PNG', optimize=True)
+        return '.png'
+    image.convert('RGB').save(
+        output,
+        'JPEG',
+        quality=settings.IMAGE_JPEG_QUALITY,
+        optimize=True,
+        progressive=True,
+    )
+    return '.jpg'
+
+
+def normalize_image(upload):
+    """Проверяет загруженную картинку и при необходимости пересжимает её.
+
+    Возвращает исходный файл, если он небольшой и без метаданных, иначе
+    новый File без метаданных, уменьшенный до IMAGE_MAX_DIMENSION.
+    Картинка открывается лениво: размеры читаются из заголовка, а JPEG
+    декодируется сразу в уменьшенном масштабе. Результат держится
+    в памяти до FILE_UPLOAD_MAX_MEMORY_SIZE, дальше - во временном файле.
+    """
+    upload.seek(0)
+    with Image.open(upload) as image:
+        width, height = image.size
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Слишком большое изображение: %(pixels)s пикселей, '
+                'допустимо не больше %(limit)s.',
+                code='too_many_pixels',
+                params={
+                    'pixels': width * height,
+                    'limit': settings.IMAGE_MAX_PIXELS,
+                },
+            )
+        if not needs_normalizing(image, upload.size):
+            upload.seek(0)
+            return upload
+        bounds = (settings.IMAGE_MAX_DIMENSION,) * 2
+        image.draft('RGB', bounds)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(bounds, Image.LANCZOS)
+        output = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        extension = _encode(image, output)
+    output.seek(0)
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return File(output, name=name + extension)
@@ -0,0 +1,78 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import transaction
+from posts.models import Post
+from posts.paginators import CursorPaginator, encode_cursor
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает числовое и курсорное разбиение ленты на разной '
+        'глубине. Данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options['posts'], options['batch_size'])
+            self.report(options['posts'], options['repeat'])
+            transaction.set_rollback(True)
+
+    def seed(self, total, batch_size):
+        author = User.objects.create_user(username='benchmark_pagination')
+        started = time.perf_counter()
+        for offset in range(0, total, batch_size):
+            Post.objects.bulk_create(
+                Post(text=f'Пост {number}', author=author)
+                for number in range(offset, min(offset + batch_size, total))
+            )
+        self.stdout.write(
+            f'Создано {total} постов за '
+            f'{time.perf_counter() - started:.1f} с'
+        )
+
+    def measure(self, fetch, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fetch()
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000
+
+    def report(self, total, repeat):
+        per_page = settings.POSTS_NUMBER
+        post_list = Post.objects.all()
+        pages = total // per_page
+        depths = sorted({1, 10, 100, 1000, 10_000, pages // 2, pages} - {0})
+        self.stdout.write(f'{"страница":>10} {"?page=, мс":>12} '
+                          f'{"?cursor=, мс":>14}')
+        for depth in depths:
+            if depth > pages:
+                continue
+            numeric = self.measure(
+                lambda: list(Paginator(post_list, per_page).page(depth)),
+                repeat,
+            )
+            cursor = None
+            if depth > 1:
+                boundary = post_list.order_by('-pub_date', '-pk')[
+                    (depth - 1) * per_page - 1
+                ]
+                cursor = encode_cursor(boundary.pub_date, boundary.pk)
+            keyset = self.measure(
+                lambda: list(
+                    CursorPaginator(post_list, per_page).get_page(cursor)
+                ),
+                repeat,
+            )
+            self.stdout.write(f'{depth:>10} {numeric:>12.2f} {keyset:>14.2f}')
@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand
+from posts.benchmark import templates
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время рендера ленты из 10/50/100 постов: строки через '
+        '{% include %}, inclusion tag и кеш карточек, с обычным и '
+        'кеширующим загрузчиком шаблонов. База не используется.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            dest='sizes',
+            action='append',
+            type=int,
+            help='Число постов на странице (можно несколько раз).',
+        )
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--output', help='Файл для отчёта в JSON.')
+
+    def handle(self, *args, **options):
+        report = templates.run(
+            sizes=options['sizes'] or templates.SIZES,
+            repeat=options['repeat'],
+        )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+        variants = list(next(iter(report.values())))
+        self.stdout.write(
+            f'{"постов":>6} ' + ' '.join(f'{name:>17}' for name in variants)
+        )
+        for size, results in report.items():
+            self.stdout.write(f'{size:>6} ' + ' '.join(
+                f'{results[name]["p50"]:>14.2f} мс' for name in variants
+            ))
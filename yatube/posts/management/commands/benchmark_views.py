@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand
+from posts.benchmark import runner
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет p50/p95/p99 времени ответа, число запросов к базе и пик '
+        'памяти для каждого view ленты. Отчёт в JSON можно сравнить '
+        'с отчётом другого коммита через --compare.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--view',
+            dest='views',
+            action='append',
+            choices=runner.VIEWS,
+            help='Замерить только этот view (можно несколько раз).',
+        )
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--memory-requests', type=int, default=20)
+        parser.add_argument(
+            '--cold-cache',
+            action='store_true',
+            help='Очищать кеш перед каждым запросом.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для отчёта в JSON.')
+        parser.add_argument('--compare', help='Отчёт для сравнения.')
+
+    def handle(self, *args, **options):
+        report = runner.run(
+            views=options['views'] or runner.VIEWS,
+            requests=options['requests'],
+            warmup=options['warmup'],
+            memory_requests=options['memory_requests'],
+            cold_cache=options['cold_cache'],
+            seed=options['seed'],
+            log=self.stderr.write,
+        )
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(text)
+        else:
+            self.stdout.write(text)
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as previous:
+                for line in runner.compare(json.load(previous), report):
+                    self.stderr.write(line)
@@ -0,0 +1,64 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from posts.benchmark import writes
+
+# Настройки SQLite по умолчанию: журнал отката и полная синхронизация.
+# journal_mode хранится в файле базы, поэтому задаётся явно.
+PLAIN_PRAGMAS = {
+    'journal_mode': 'delete',
+    'synchronous': 'full',
+    'mmap_size': 0,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет пропускную способность параллельной записи комментариев '
+        'из нескольких потоков. --plain - SQLite без WAL и mmap для '
+        'сравнения. Комментарии остаются в базе: запускать на отдельной.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--plain',
+            action='store_true',
+            help='Соединения SQLite без PRAGMA из SQLITE_PRAGMAS.',
+        )
+        parser.add_argument('--output', help='Файл для отчёта в JSON.')
+
+    def handle(self, *args, **options):
+        if options['plain']:
+            with override_settings(SQLITE_PRAGMAS=PLAIN_PRAGMAS):
+                connection.close()
+                report = self.run(options)
+            connection.close()
+        else:
+            report = self.run(options)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+        self.stdout.write(
+            f'{report["vendor"]} ({report["journal_mode"]}), '
+            f'потоков {report["threads"]}: '
+            f'{report["writes_per_second"]:.0f} записей/с, '
+            f'записано {report["writes"]}, ошибок {report["errors"]}'
+        )
+        if report['latency_ms']:
+            latency = report['latency_ms']
+            self.stdout.write(
+                f'p50 {latency["p50"]:.1f} мс, p95 {latency["p95"]:.1f} мс, '
+                f'p99 {latency["p99"]:.1f} мс'
+            )
+
+    def run(self, options):
+        return writes.run(
+            threads=options['threads'],
+            writes=options['writes'],
+            seed=options['seed'],
+        )
@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.utils import timezone
+from posts.models import Comment, Follow, Post, TimelineEntry
+from posts.paginators import CommentPaginator, CursorPaginator
+from posts.timeline import TimelinePaginator
+
+
+class Captured(Exception):
+    pass
+
+
+class CountQuery:
+    """План запроса, который выполняет queryset.count().
+
+    SQL перехватывается до отправки в базу, поэтому в план попадает
+    ровно тот SELECT COUNT(*), что строит Paginator, а сам подсчёт не
+    выполняется.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def sql(self, connection):
+        statements = []
+
+        def capture(execute, sql, params, many, context):
+            statements.append((sql, params))
+            raise Captured
+
+        # Настройка нового соединения тоже идёт через execute.
+        connection.ensure_connection()
+        with connection.execute_wrapper(capture):
+            try:
+                self.queryset.count()
+            except Captured:
+                pass
+        return statements[0]
+
+    def explain(self):
+        connection = connections[self.queryset.db]
+        sql, params = self.sql(connection)
+        prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+        return '\n'.join(
+            row if isinstance(row, str) else ' '.join(map(str, row))
+            for row in rows
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Печатает план выполнения (EXPLAIN) запросов лент, чтобы '
+        'убедиться, что они используют индексы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--author-id', type=int, default=1)
+        parser.add_argument('--group-id', type=int, default=1)
+        parser.add_argument('--post-id', type=int, default=1)
+        parser.add_argument('--user-id', type=int, default=1)
+
+    def feed_queries(self, author_id, group_id, post_id, user_id):
+        per_page = settings.POSTS_NUMBER
+        timeline = TimelineEntry.objects.filter(user_id=user_id).values(
+            'pub_date', 'post_id'
+        )
+        feeds = {
+            'index': CursorPaginator(Post.objects.all(), per_page),
+            'group_posts': CursorPaginator(
+                Post.objects.filter(group_id=group_id), per_page
+            ),
+            'profile': CursorPaginator(
+                Post.objects.filter(author_id=author_id), per_page
+            ),
+            'follow_index': TimelinePaginator([timeline], per_page),
+        }
+        for name, keyset in feeds.items():
+            post_list = keyset.object_list
+            yield f'{name}: COUNT', CountQuery(post_list)
+            yield f'{name}: ?page=2', keyset._ordered(
+                post_list, backwards=False
+            )[per_page:per_page * 2]
+            yield f'{name}: ?cursor=', keyset._ordered(
+                keyset._after(post_list, timezone.now(), post_id, False),
+                backwards=False,
+            )[:per_page + 1]
+        yield 'profile: following', Follow.objects.filter(
+            user_id=user_id, author_id=author_id
+        )
+        comments = CommentPaginator(
+            Comment.objects.filter(post_id=post_id).order_by('created', 'pk'),
+            settings.COMMENTS_NUMBER,
+        )
+        yield 'post_detail: comments', comments._ordered(
+            comments.object_list, backwards=False
+        )[:settings.COMMENTS_NUMBER + 1]
+        yield 'post_comments: ?cursor=', comments._ordered(
+            comments._after(
+                comments.object_list, timezone.now(), post_id, False
+            ),
+            backwards=False,
+        )[:settings.COMMENTS_NUMBER + 1]
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'База данных: {connection.vendor}\n')
+        for title, queryset in self.feed_queries(
+            options['author_id'],
+            options['group_id'],
+            options['post_id'],
+            options['user_id'],
+        ):
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            self.stdout.write(queryset.explain())
+            self.stdout.write('')
@@ -0,0 +1,35 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает посты, комментарии, группы или подписки '
+        'в JSON Lines или CSV.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(bulk.MODELS))
+        parser.add_argument('path', help='Файл или - для stdout.')
+        parser.add_argument('--format', choices=bulk.FORMATS)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        data_format = options['format'] or bulk.guess_format(path)
+        _, fields = bulk.MODELS[options['model']]
+        rows = bulk.export_rows(options['model'], options['batch_size'])
+        started = time.perf_counter()
+        if path == '-':
+            written = bulk.write_rows(sys.stdout, data_format, fields, rows)
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as stream:
+                written = bulk.write_rows(stream, data_format, fields, rows)
+        elapsed = time.perf_counter() - started
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено строк: {written}, {elapsed:.1f} с, '
+            f'{written / max(elapsed, 1e-9):.0f} строк/с'
+        ))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from posts.benchmark import data
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт синтетический социальный граф для замеров: пользователей '
+        'со степенным распределением подписчиков, группы, посты с '
+        'картинками и без, комментарии. Запускать на отдельной базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20_000)
+        parser.add_argument('--comments', type=int, default=50_000)
+        parser.add_argument('--follows-per-user', type=int, default=30)
+        parser.add_argument('--image-ratio', type=float, default=0.2)
+        parser.add_argument(
+            '--exponent',
+            type=float,
+            default=1.1,
+            help='Показатель закона Ципфа для популярности авторов.',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        data.generate(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows_per_user=options['follows_per_user'],
+            image_ratio=options['image_ratio'],
+            exponent=options['exponent'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,83 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково загружает посты, комментарии, группы или подписки из '
+        'JSON Lines или CSV пачками через bulk_create. Прогресс '
+        'сохраняется в файле <path>.checkpoint, --resume продолжает '
+        'прерванную загрузку.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(bulk.MODELS))
+        parser.add_argument('path', help='Файл или - для stdin.')
+        parser.add_argument('--format', choices=bulk.FORMATS)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Пропустить строки, уже записанные по checkpoint.',
+        )
+        parser.add_argument(
+            '--skip-derived',
+            action='store_true',
+            help='Не пересчитывать счётчики, ленты и поисковый индекс.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        data_format = options['format'] or bulk.guess_format(path)
+        if path == '-':
+            if options['resume']:
+                raise CommandError('--resume недоступен для stdin.')
+            result = self.load(sys.stdin, data_format, None, options)
+        else:
+            checkpoint = bulk.Checkpoint(path)
+            with open(path, encoding='utf-8', newline='') as stream:
+                result = self.load(stream, data_format, checkpoint, options)
+            checkpoint.clear()
+        if not options['skip_derived']:
+            started = time.perf_counter()
+            with transaction.atomic():
+                bulk.refresh_derived(options['model'], result.pages())
+            self.stderr.write(
+                f'Счётчики, ленты и индекс обновлены за '
+                f'{time.perf_counter() - started:.1f} с'
+            )
+
+    def load(self, stream, data_format, checkpoint, options):
+        skip = checkpoint.load() if checkpoint and options['resume'] else 0
+        started = time.perf_counter()
+
+        def on_batch(done):
+            if checkpoint:
+                checkpoint.save(done)
+            if options['verbosity'] > 1:
+                self.report(done - skip, started, prefix=f'{done}: ')
+
+        result = bulk.import_rows(
+            options['model'],
+            bulk.read_rows(stream, data_format),
+            options['batch_size'],
+            skip=skip,
+            on_batch=on_batch,
+        )
+        self.report(
+            result.done - skip, started, style=self.style.SUCCESS,
+            suffix=f', новых: {result.inserted}, '
+                   f'уже были в базе: {result.skipped}',
+        )
+        return result
+
+    def report(self, rows, started, prefix='', suffix='', style=str):
+        elapsed = time.perf_counter() - started
+        self.stderr.write(style(
+            f'{prefix}загружено строк: {rows}, {elapsed:.1f} с, '
+            f'{rows / max(elapsed, 1e-9):.0f} строк/с{suffix}'
+        ))
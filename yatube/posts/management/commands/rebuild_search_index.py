@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Заново индексирует посты, комментарии и группы для полнотекстового '
+        'поиска.'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            documents = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Документов в индексе: {documents}, '
+            f'{time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from posts.counters import recount_all
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики постов, комментариев и подписок '
+        '(после массового импорта или ручных правок в базе).'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            recount_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны за {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,56 @@
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from posts.models import Post
+from posts.thumbnails import all_variants, ready_backend
+from sorl.thumbnail import get_thumbnail
+
+logger = logging.getLogger(__name__)
+
+
+def warm(image_name):
+    """Создаёт недостающие размеры картинки; True - если что-то создано."""
+    created = False
+    for geometry, options in all_variants():
+        if ready_backend.get_ready_thumbnail(image_name, geometry, **options):
+            continue
+        try:
+            get_thumbnail(image_name, geometry, **options)
+        except Exception:
+            logger.exception('Не удалось создать миниатюру %s', image_name)
+            return created
+        created = True
+    return created
+
+
+class Command(BaseCommand):
+    help = (
+        'Заранее создаёт все размеры картинок постов для ленты и страницы '
+        'поста в пуле процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=None)
+        parser.add_argument('--chunk-size', type=int, default=16)
+
+    def handle(self, *args, **options):
+        images = list(
+            Post.objects.exclude(image='').exclude(image__isnull=True)
+            .values_list('image', flat=True)
+        )
+        # Дочерние процессы открывают собственные соединения с базой.
+        connections.close_all()
+        started = time.perf_counter()
+        created = 0
+        with ProcessPoolExecutor(max_workers=options['processes']) as pool:
+            for is_created in pool.map(
+                warm, images, chunksize=options['chunk_size']
+            ):
+                created += is_created
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок: {len(images)}, с новыми размерами: {created}, '
+            f'{time.perf_counter() - started:.1f} с'
+        ))
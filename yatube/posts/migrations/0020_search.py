@@ -0,0 +1,205 @@
+import re
+
+from django.db import migrations
+
+# Схема и заполнение индекса на момент миграции; posts.search может
+# меняться дальше, а миграция должна давать тот же результат.
+# Идентификатор документа - pk * 3 + номер вида (post, comment, group).
+SQLITE_CREATE = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS posts_search USING fts5('
+    'body, kind UNINDEXED, post_id UNINDEXED, '
+    "tokenize = 'unicode61 remove_diacritics 2')",
+)
+SQLITE_DOCUMENTS = (
+    "SELECT id * 3, 'post', id, text FROM posts_post",
+    "SELECT id * 3 + 1, 'comment', post_id, text FROM posts_comment "
+    'WHERE post_id IS NOT NULL',
+    "SELECT id * 3 + 2, 'group', NULL, title FROM posts_group",
+)
+POSTGRES_CREATE = (
+    'CREATE TABLE IF NOT EXISTS posts_search ('
+    'id bigint PRIMARY KEY, kind varchar(10) NOT NULL, '
+    'post_id integer, document tsvector NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS posts_search_document_idx '
+    'ON posts_search USING GIN (document)',
+    'CREATE INDEX IF NOT EXISTS posts_search_post_id_idx '
+    'ON posts_search (post_id)',
+)
+POSTGRES_FILL = (
+    'INSERT INTO posts_search (id, kind, post_id, document) '
+    "SELECT id * 3, 'post', id, to_tsvector('russian', text) "
+    'FROM posts_post',
+    'INSERT INTO posts_search (id, kind, post_id, document) '
+    "SELECT id * 3 + 1, 'comment', post_id, to_tsvector('russian', text) "
+    'FROM posts_comment WHERE post_id IS NOT NULL',
+    'INSERT INTO posts_search (id, kind, post_id, document) '
+    "SELECT id * 3 + 2, 'group', NULL, to_tsvector('russian', title) "
+    'FROM posts_group',
+)
+BATCH_SIZE = 1000
+
+# Копия posts.stemmer на момент миграции: правки стеммера не должны
+# менять то, что заполняет уже применённая миграция.
+VOWELS = 'аеиоуыэюя'
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile('[а-я]')
+
+
+def _endings(after_a=(), plain=()):
+    """Окончания, требующие 'а'/'я' перед собой, и все - от длинных."""
+    return (
+        frozenset(after_a),
+        tuple(sorted((*after_a, *plain), key=len, reverse=True)),
+    )
+
+
+# Окончания первой группы удаляются, только если перед ними 'а' или 'я'.
+PERFECTIVE_GERUND = _endings(
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+REFLEXIVE = _endings(plain=('ся', 'сь'))
+ADJECTIVE = _endings(plain=(
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = _endings(
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+VERB = _endings(
+    (
+        'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+        'ет', 'ют', 'ны', 'ть', 'ешь', 'нно',
+    ),
+    (
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+        'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+        'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+    ),
+)
+NOUN = _endings(plain=(
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я',
+))
+SUPERLATIVE = _endings(plain=('ейш', 'ейше'))
+DERIVATIONAL = _endings(plain=('ост', 'ость'))
+
+
+def _regions(word):
+    """Начала областей RV и R2 алгоритма."""
+    rv = next(
+        (i + 1 for i, char in enumerate(word) if char in VOWELS), len(word)
+    )
+
+    def after_vowel_consonant(start):
+        for i in range(start + 1, len(word)):
+            if word[i - 1] in VOWELS and word[i] not in VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = after_vowel_consonant(0)
+    return rv, after_vowel_consonant(r1)
+
+
+def _strip(word, start, groups):
+    """Удаляет самое длинное окончание, целиком лежащее после start.
+
+    Возвращает None, если окончание не найдено или для окончания первой
+    группы перед ним нет 'а'/'я'.
+    """
+    after_a, endings = groups
+    for ending in endings:
+        position = len(word) - len(ending)
+        if position < start or not word.endswith(ending):
+            continue
+        if ending in after_a and (
+            position - 1 < start or word[position - 1] not in 'ая'
+        ):
+            return None
+        return word[:position]
+    return None
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC_RE.search(word):
+        return word
+    rv, r2 = _regions(word)
+    stripped = _strip(word, rv, PERFECTIVE_GERUND)
+    if stripped is None:
+        word = _strip(word, rv, REFLEXIVE) or word
+        adjective = _strip(word, rv, ADJECTIVE)
+        if adjective is not None:
+            stripped = _strip(adjective, rv, PARTICIPLE) or adjective
+        else:
+            stripped = _strip(word, rv, VERB) or _strip(word, rv, NOUN)
+    word = stripped or word
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    word = _strip(word, r2, DERIVATIONAL) or word
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    superlative = _strip(word, rv, SUPERLATIVE)
+    if superlative is not None:
+        word = superlative
+        if word.endswith('нн') and len(word) - 2 >= rv:
+            word = word[:-1]
+        return word
+    if word.endswith('ь') and len(word) - 1 >= rv:
+        return word[:-1]
+    return word
+
+
+def stem_words(text):
+    """Основы всех слов текста в порядке следования."""
+    return [stem(word) for word in WORD_RE.findall(text.lower())]
+
+
+def fill_sqlite(connection):
+    # FTS5 не знает русской морфологии: в индекс пишутся основы слов.
+    with connection.cursor() as cursor, connection.cursor() as writer:
+        for sql in SQLITE_DOCUMENTS:
+            cursor.execute(sql)
+            while True:
+                rows = cursor.fetchmany(BATCH_SIZE)
+                if not rows:
+                    break
+                writer.executemany(
+                    'INSERT INTO posts_search (rowid, body, kind, post_id) '
+                    'VALUES (%s, %s, %s, %s)',
+                    [
+                        (rowid, ' '.join(stem_words(text)), kind, post_id)
+                        for rowid, kind, post_id, text in rows
+                    ],
+                )
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        for sql in SQLITE_CREATE:
+            schema_editor.execute(sql)
+        fill_sqlite(connection)
+    elif connection.vendor == 'postgresql':
+        for sql in POSTGRES_CREATE + POSTGRES_FILL:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_timeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
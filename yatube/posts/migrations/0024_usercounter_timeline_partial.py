@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_celebrities(apps, schema_editor):
+    # До этой миграции при fan-out пропускались авторы, у которых не
+    # меньше TIMELINE_FANOUT_LIMIT подписчиков.
+    UserCounter = apps.get_model('posts', 'UserCounter')
+    UserCounter.objects.filter(
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT
+    ).update(timeline_partial=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounter',
+            name='timeline_partial',
+            field=models.BooleanField(
+                default=False, verbose_name='Лента подписчиков неполная'
+            ),
+        ),
+        migrations.RunPython(mark_celebrities, migrations.RunPython.noop),
+    ]
@@ -4,7 +4,30 @@ from django.db import models
 User = get_user_model()
 
 
-class Group(models.Model):
+class CounterFieldsMixin:
+    """Не перезаписывает денормализованные счётчики при save().
+
+    Счётчики меняются только атомарными UPDATE из posts.signals, поэтому
+    сохранение экземпляра, загруженного до этого, не должно их затирать.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and not args
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        ):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class Group(CounterFieldsMixin, models.Model):
     title = models.CharField(
         max_length=200,
         verbose_name='Название группы',
@@ -23,6 +46,12 @@ class Group(models.Model):
         verbose_name='Описание группы',
         help_text='Краткое описание группы'
     )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число постов',
+    )
+    counter_fields = ('posts_count',)
 
     def __str__(self):
         return self.title[:15]
@@ -32,7 +61,7 @@ class Group(models.Model):
         verbose_name_plural = 'Группы'
 
 
-class Post(models.Model):
+class Post(CounterFieldsMixin, models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
         help_text='Текст нового поста'
@@ -41,6 +70,11 @@ class Post(models.Model):
         auto_now_add=True,
         verbose_name='Дата',
         help_text='Дата создания поста')
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Изменён',
+        help_text='Версия поста для кеша его карточки',
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -64,11 +98,31 @@ class Post(models.Model):
         verbose_name='Картинка',
         help_text='Загрузите картинку'
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число комментариев',
+    )
+    counter_fields = ('comments_count',)
 
     class Meta:
         verbose_name = 'Сообщение'
         verbose_name_plural = 'Сообщения'
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -106,6 +160,16 @@ class Comment(models.Model):
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            models.Index(
+                fields=('post', 'created', 'id'),
+                name='comment_post_created_id_idx'
+            ),
+            models.Index(
+                fields=('created',),
+                name='comment_created_idx'
+            ),
+        )
 
 
 class Follow(models.Model):
@@ -136,3 +200,84 @@ class Follow(models.Model):
                 name='unique_pair'
             ),
         )
+
+
+class UserCounter(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counter',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число постов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число подписок',
+    )
+    # Посты автора хотя бы раз не разложены по лентам подписчиков: пока
+    # флаг стоит, они подмешиваются к ленте при чтении.
+    timeline_partial = models.BooleanField(
+        default=False,
+        verbose_name='Лента подписчиков неполная',
+    )
+
+    def __str__(self):
+        return f'Счётчики {self.user}'
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class TimelineEntry(models.Model):
+    """Пост в заранее собранной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации поста')
+
+    def __str__(self):
+        return f'{self.post_id} в ленте {self.user_id}'
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_post'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_user_author_idx'
+            ),
+        )
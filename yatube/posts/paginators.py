@@ -0,0 +1,189 @@
+import base64
+import binascii
+
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+
+CURSOR_SEPARATOR = '|'
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(pub_date, pk, backwards=False):
+    """Упаковывает позицию (pub_date, id) в непрозрачную строку."""
+    raw = CURSOR_SEPARATOR.join(
+        (BACKWARD if backwards else FORWARD, pub_date.isoformat(), str(pk))
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (backwards, pub_date, pk) или бросает InvalidCursor."""
+    try:
+        raw = base64.urlsafe_b64decode(
+            cursor + '=' * (-len(cursor) % 4)
+        ).decode()
+        direction, pub_date, pk = raw.split(CURSOR_SEPARATOR)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if direction not in (FORWARD, BACKWARD) or pub_date is None:
+        raise InvalidCursor(cursor)
+    return direction == BACKWARD, pub_date, pk
+
+
+class CursorPage(Page):
+    """Страница курсорного режима.
+
+    Вместо порядкового номера в number хранится курсор, по которому
+    страница получена (1 для первой), - он различает страницы в ключах
+    кеша шаблона.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, cursor=None,
+                 next_cursor=None, previous_cursor=None):
+        super().__init__(object_list, cursor or 1, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Постраничное разбиение по ключу (pub_date, id).
+
+    В отличие от Paginator не выполняет COUNT и OFFSET: каждая страница
+    выбирается одним запросом по индексу, поэтому страница N стоит
+    столько же, сколько первая. descending - новые записи на первой
+    странице.
+    """
+    date_field = 'pub_date'
+    key_field = 'pk'
+    descending = True
+
+    def _position(self, obj):
+        if isinstance(obj, dict):
+            return obj[self.date_field], obj[self.key_field]
+        return getattr(obj, self.date_field), getattr(obj, self.key_field)
+
+    def _ordered(self, queryset, backwards):
+        prefix = '-' if self.descending != backwards else ''
+        return queryset.order_by(
+            f'{prefix}{self.date_field}', f'{prefix}{self.key_field}'
+        )
+
+    def _after(self, queryset, pub_date, pk, backwards):
+        lookup = 'lt' if self.descending != backwards else 'gt'
+        return queryset.filter(
+            Q(**{f'{self.date_field}__{lookup}': pub_date})
+            | Q(**{self.date_field: pub_date,
+                   f'{self.key_field}__{lookup}': pk})
+        )
+
+    def _fetch(self, queryset, position, backwards):
+        """Возвращает до per_page + 1 строк после позиции курсора."""
+        if position:
+            queryset = self._after(queryset, *position, backwards)
+        return list(self._ordered(queryset, backwards)[:self.per_page + 1])
+
+    def page_by_cursor(self, cursor):
+        backwards, position = False, None
+        if cursor:
+            backwards, *position = decode_cursor(cursor)
+        rows = self._fetch(self.object_list, position, backwards)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+        if not rows:
+            return CursorPage(rows, self, cursor)
+        has_next = has_more if not backwards else True
+        has_previous = has_more if backwards else position is not None
+        return CursorPage(
+            rows,
+            self,
+            cursor,
+            next_cursor=(
+                encode_cursor(*self._position(rows[-1]))
+                if has_next else None
+            ),
+            previous_cursor=(
+                encode_cursor(*self._position(rows[0]), backwards=True)
+                if has_previous else None
+            ),
+        )
+
+    def get_page(self, cursor):
+        try:
+            return self.page_by_cursor(cursor)
+        except InvalidCursor:
+            return self.page_by_cursor(None)
+
+
+class CommentPaginator(CursorPaginator):
+    """Комментарии поста в порядке написания.
+
+    Страница выбирается по индексу (post, created, id).
+    """
+    date_field = 'created'
+    descending = False
+
+
+ESTIMATE_SQL = {
+    # MAX(rowid) берётся из конца B-дерева и завышается лишь удалёнными
+    # строками.
+    'sqlite': 'SELECT MAX(rowid) FROM {table}',
+    'postgresql': (
+        "SELECT reltuples::bigint FROM pg_class WHERE relname = '{table}'"
+    ),
+    'mysql': (
+        'SELECT table_rows FROM information_schema.tables '
+        "WHERE table_schema = DATABASE() AND table_name = '{table}'"
+    ),
+}
+
+
+def estimate_count(queryset):
+    """Оценка числа строк таблицы из статистики базы или None."""
+    connection = connections[queryset.db]
+    sql = ESTIMATE_SQL.get(connection.vendor)
+    if sql is None:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(table=queryset.model._meta.db_table))
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для админки больших таблиц.
+
+    Пока к списку не применён ни поиск, ни фильтр, вместо COUNT(*) по
+    всей таблице берётся оценка из статистики базы; точный подсчёт
+    остаётся для небольших таблиц и отфильтрованных списков.
+    """
+    exact_count_limit = 10_000
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = estimate_count(self.object_list)
+            if estimate and estimate > self.exact_count_limit:
+                return estimate
+        return super().count
@@ -0,0 +1,319 @@
+from django.db import connections, router
+from posts.models import Group, Post
+from posts.stemmer import stem_words
+
+TABLE = 'posts_search'
+POST = 'post'
+COMMENT = 'comment'
+GROUP = 'group'
+# Виды документов совпадают с model_name моделей. Идентификатор
+# документа - pk объекта и номер вида в одном целом, так что документ
+# обновляется и удаляется по первичному ключу индекса.
+KINDS = (POST, COMMENT, GROUP)
+BATCH_SIZE = 1000
+GROUPS_LIMIT = 5
+
+
+def document_id(kind, pk):
+    return pk * len(KINDS) + KINDS.index(kind)
+
+
+def execute_many(cursor, sql, params_list):
+    """executemany, но одиночный документ - обычным execute.
+
+    Панель SQL debug_toolbar падает на executemany внутри запроса,
+    а из view документы сохраняются по одному.
+    """
+    if len(params_list) == 1:
+        cursor.execute(sql, params_list[0])
+    else:
+        cursor.executemany(sql, params_list)
+
+
+class SQLiteIndex:
+    """Инвертированный индекс на виртуальной таблице FTS5.
+
+    FTS5 не знает русской морфологии, поэтому в таблицу пишутся основы
+    слов (posts.stemmer), а запрос перед поиском приводится к ним же.
+    Каждая основа ищется и как префикс, ранжирование - по BM25.
+    """
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5('
+            'body, kind UNINDEXED, post_id UNINDEXED, '
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def save(self, cursor, documents):
+        documents = [
+            (document_id(kind, pk), ' '.join(stem_words(text)), kind, post_id)
+            for kind, pk, post_id, text in documents
+        ]
+        execute_many(
+            cursor,
+            f'DELETE FROM {TABLE} WHERE rowid = %s',
+            [(rowid,) for rowid, *_ in documents],
+        )
+        execute_many(
+            cursor,
+            f'INSERT INTO {TABLE} (rowid, body, kind, post_id) '
+            'VALUES (%s, %s, %s, %s)',
+            documents,
+        )
+
+    def delete(self, cursor, kind, pk):
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid = %s', (document_id(kind, pk),)
+        )
+
+    def delete_post(self, cursor, post_id):
+        cursor.execute(f'DELETE FROM {TABLE} WHERE post_id = %s', (post_id,))
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {TABLE}')
+
+    def prepare(self, query):
+        terms = dict.fromkeys(stem_words(query))
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def count_posts(self, cursor, query):
+        cursor.execute(
+            f'SELECT COUNT(DISTINCT post_id) FROM {TABLE} '
+            f'WHERE {TABLE} MATCH %s AND kind != %s',
+            (query, GROUP),
+        )
+        return cursor.fetchone()[0]
+
+    def post_ids(self, cursor, query, offset, limit):
+        cursor.execute(
+            f'SELECT post_id FROM {TABLE} '
+            f'WHERE {TABLE} MATCH %s AND kind != %s '
+            'GROUP BY post_id ORDER BY MIN(rank), post_id DESC '
+            'LIMIT %s OFFSET %s',
+            (query, GROUP, limit, offset),
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def group_ids(self, cursor, query, limit):
+        cursor.execute(
+            f'SELECT rowid FROM {TABLE} '
+            f'WHERE {TABLE} MATCH %s AND kind = %s ORDER BY rank LIMIT %s',
+            (query, GROUP, limit),
+        )
+        return [row[0] // len(KINDS) for row in cursor.fetchall()]
+
+
+class PostgresIndex:
+    """Таблица tsvector с GIN-индексом и русской конфигурацией Postgres."""
+    config = 'russian'
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {TABLE} ('
+            'id bigint PRIMARY KEY, kind varchar(10) NOT NULL, '
+            'post_id integer, document tsvector NOT NULL)'
+        )
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {TABLE}_document_idx '
+            f'ON {TABLE} USING GIN (document)'
+        )
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {TABLE}_post_id_idx '
+            f'ON {TABLE} (post_id)'
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def save(self, cursor, documents):
+        execute_many(
+            cursor,
+            f'INSERT INTO {TABLE} (id, kind, post_id, document) '
+            f"VALUES (%s, %s, %s, to_tsvector('{self.config}', %s)) "
+            'ON CONFLICT (id) DO UPDATE SET '
+            'post_id = EXCLUDED.post_id, document = EXCLUDED.document',
+            [
+                (document_id(kind, pk), kind, post_id, text)
+                for kind, pk, post_id, text in documents
+            ],
+        )
+
+    def delete(self, cursor, kind, pk):
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE id = %s', (document_id(kind, pk),)
+        )
+
+    def delete_post(self, cursor, post_id):
+        cursor.execute(f'DELETE FROM {TABLE} WHERE post_id = %s', (post_id,))
+
+    def clear(self, cursor):
+        cursor.execute(f'TRUNCATE {TABLE}')
+
+    def prepare(self, query):
+        return query.strip()
+
+    def count_posts(self, cursor, query):
+        cursor.execute(
+            f'SELECT COUNT(DISTINCT post_id) FROM {TABLE} '
+            f"WHERE document @@ plainto_tsquery('{self.config}', %s) "
+            'AND kind <> %s',
+            (query, GROUP),
+        )
+        return cursor.fetchone()[0]
+
+    def post_ids(self, cursor, query, offset, limit):
+        cursor.execute(
+            f'SELECT post_id FROM {TABLE}, '
+            f"plainto_tsquery('{self.config}', %s) AS query "
+            'WHERE document @@ query AND kind <> %s GROUP BY post_id '
+            'ORDER BY MAX(ts_rank(document, query)) DESC, post_id DESC '
+            'LIMIT %s OFFSET %s',
+            (query, GROUP, limit, offset),
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def group_ids(self, cursor, query, limit):
+        cursor.execute(
+            f'SELECT id FROM {TABLE}, '
+            f"plainto_tsquery('{self.config}', %s) AS query "
+            'WHERE document @@ query AND kind = %s '
+            'ORDER BY ts_rank(document, query) DESC LIMIT %s',
+            (query, GROUP, limit),
+        )
+        return [row[0] // len(KINDS) for row in cursor.fetchall()]
+
+
+INDEXES = {
+    'sqlite': SQLiteIndex(),
+    'postgresql': PostgresIndex(),
+}
+
+
+def get_connection(write=False):
+    """Соединение, в которое роутер отправил бы запрос к постам."""
+    if write:
+        return connections[router.db_for_write(Post)]
+    return connections[router.db_for_read(Post)]
+
+
+def get_index(connection):
+    """Индекс для базы данных; None, если база не поддерживается."""
+    return INDEXES.get(connection.vendor)
+
+
+def save(*documents):
+    """Добавляет или обновляет документы (kind, pk, post_id, text)."""
+    connection = get_connection(write=True)
+    index = get_index(connection)
+    if index:
+        with connection.cursor() as cursor:
+            index.save(cursor, documents)
+
+
+def delete(kind, pk):
+    connection = get_connection(write=True)
+    index = get_index(connection)
+    if index:
+        with connection.cursor() as cursor:
+            index.delete(cursor, kind, pk)
+
+
+def delete_post(post_id):
+    """Удаляет пост и комментарии к нему: у них post_id станет NULL."""
+    connection = get_connection(write=True)
+    index = get_index(connection)
+    if index:
+        with connection.cursor() as cursor:
+            index.delete_post(cursor, post_id)
+
+
+def index_post(post):
+    save((POST, post.pk, post.pk, post.text))
+
+
+def index_comment(comment):
+    save((COMMENT, comment.pk, comment.post_id, comment.text))
+
+
+def index_group(group):
+    save((GROUP, group.pk, None, group.title))
+
+
+DOCUMENTS_SQL = (
+    (POST, 'SELECT id, id, text FROM posts_post'),
+    (COMMENT, 'SELECT id, post_id, text FROM posts_comment '
+              'WHERE post_id IS NOT NULL'),
+    (GROUP, 'SELECT id, NULL, title FROM posts_group'),
+)
+
+
+def rebuild(connection=None):
+    """Заново индексирует все посты, комментарии и группы пачками."""
+    connection = connection or get_connection(write=True)
+    index = get_index(connection)
+    if index is None:
+        return 0
+    total = 0
+    with connection.cursor() as cursor, connection.cursor() as writer:
+        index.clear(writer)
+        for kind, sql in DOCUMENTS_SQL:
+            cursor.execute(sql)
+            while True:
+                rows = cursor.fetchmany(BATCH_SIZE)
+                if not rows:
+                    break
+                index.save(writer, [(kind, *row) for row in rows])
+                total += len(rows)
+    return total
+
+
+class PostSearchResults:
+    """Посты, найденные по запросу, от самых релевантных.
+
+    Совпадение в комментарии находит пост, к которому он оставлен.
+    Поддерживает count() и срезы, поэтому передаётся Paginator как есть:
+    страница - запрос к индексу за id и запрос за самими постами.
+    """
+
+    def __init__(self, query):
+        self.connection = get_connection()
+        self.index = get_index(self.connection)
+        self.query = self.index.prepare(query) if self.index else ''
+
+    def count(self):
+        if not self.query:
+            return 0
+        with self.connection.cursor() as cursor:
+            return self.index.count_posts(cursor, self.query)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        if not self.query:
+            return []
+        start = item.start or 0
+        with self.connection.cursor() as cursor:
+            ids = self.index.post_ids(
+                cursor, self.query, start, item.stop - start
+            )
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def search_groups(query, limit=GROUPS_LIMIT):
+    connection = get_connection()
+    index = get_index(connection)
+    query = index.prepare(query) if index else ''
+    if not query:
+        return []
+    with connection.cursor() as cursor:
+        ids = index.group_ids(cursor, query, limit)
+    groups = Group.objects.in_bulk(ids)
+    return [groups[pk] for pk in ids if pk in groups]
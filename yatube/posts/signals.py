@@ -0,0 +1,225 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from posts import search
+from posts.cache import GROUPS, POSTS, PROFILES, bump
+from posts.counters import shift, shift_user
+from posts.models import Comment, Follow, Group, Post, User
+from posts.timeline import (add_author, backfill, fan_out_post, remove_author,
+                            remove_post)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, raw, **kwargs):
+    instance._previous_group_id = None
+    instance._previous_author_id = None
+    if instance.pk and not raw:
+        previous = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'author_id'
+        ).first()
+        if previous:
+            (instance._previous_group_id,
+             instance._previous_author_id) = previous
+
+
+def author_changed(instance):
+    previous_author_id = getattr(instance, '_previous_author_id', None)
+    return bool(previous_author_id) and (
+        previous_author_id != instance.author_id
+    )
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        shift_user(instance.author_id, posts_count=1)
+        if instance.group_id:
+            shift(Group.objects.filter(pk=instance.group_id), posts_count=1)
+        return
+    if author_changed(instance):
+        # Смена автора - как удаление поста у одного и публикация у другого.
+        shift_user(
+            instance._previous_author_id, create=False, posts_count=-1
+        )
+        shift_user(instance.author_id, posts_count=1)
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        if previous_group_id:
+            shift(Group.objects.filter(pk=previous_group_id), posts_count=-1)
+        if instance.group_id:
+            shift(Group.objects.filter(pk=instance.group_id), posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    shift_user(instance.author_id, create=False, posts_count=-1)
+    if instance.group_id:
+        shift(Group.objects.filter(pk=instance.group_id), posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw, **kwargs):
+    if created and not raw and instance.post_id:
+        shift(Post.objects.filter(pk=instance.post_id), comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id:
+        shift(Post.objects.filter(pk=instance.post_id), comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        shift_user(instance.user_id, following_count=1)
+        shift_user(instance.author_id, followers_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    shift_user(instance.user_id, create=False, following_count=-1)
+    shift_user(instance.author_id, create=False, followers_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_saved_post(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        fan_out_post(instance)
+    elif author_changed(instance):
+        remove_post(instance.pk)
+        fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def add_followed_posts(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        add_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_unfollowed_posts(sender, instance, **kwargs):
+    remove_author(instance.user_id, instance.author_id)
+    # Автор мог опуститься ниже TIMELINE_FANOUT_LIMIT.
+    backfill(instance.author_id)
+
+
+def bump_post_pages(post_id, author_id, *group_ids, previous_author_id=None):
+    """Сбрасывает кеш всех страниц, на которых виден пост."""
+    usernames = User.objects.filter(
+        pk__in=[pk for pk in (author_id, previous_author_id) if pk]
+    ).values_list('username', flat=True)
+    slugs = Group.objects.filter(
+        pk__in=[group_id for group_id in group_ids if group_id]
+    ).values_list('slug', flat=True)
+    bump(
+        'index',
+        f'post:{post_id}',
+        *(f'profile:{username}' for username in usernames),
+        *(f'group:{slug}' for slug in slugs),
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_saved_post(sender, instance, **kwargs):
+    bump_post_pages(
+        instance.pk,
+        instance.author_id,
+        instance.group_id,
+        getattr(instance, '_previous_group_id', None),
+        previous_author_id=getattr(instance, '_previous_author_id', None),
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_commented_post(sender, instance, **kwargs):
+    post = Post.objects.filter(pk=instance.post_id).values_list(
+        'author_id', 'group_id'
+    ).first()
+    if post:
+        bump_post_pages(instance.post_id, *post)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follow_profiles(sender, instance, **kwargs):
+    bump(*(
+        f'profile:{username}' for username in User.objects.filter(
+            pk__in=(instance.user_id, instance.author_id)
+        ).values_list('username', flat=True)
+    ))
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, raw, **kwargs):
+    instance._previous_slug = None
+    if instance.pk and not raw:
+        instance._previous_slug = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+def bump_saved_group(sender, instance, **kwargs):
+    names = [f'group:{instance.slug}']
+    previous_slug = getattr(instance, '_previous_slug', None)
+    if previous_slug and previous_slug != instance.slug:
+        # Ссылки на группу есть в лентах, профилях и на страницах постов.
+        names += [f'group:{previous_slug}', 'index', PROFILES, POSTS]
+    bump(*names)
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, raw, update_fields, **kwargs):
+    instance._previous_username = None
+    if raw or not instance.pk:
+        return
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    instance._previous_username = User.objects.filter(
+        pk=instance.pk
+    ).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def bump_renamed_user(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_username', None)
+    if previous and previous != instance.username:
+        bump(
+            f'profile:{previous}', f'profile:{instance.username}',
+            'index', GROUPS, POSTS,
+        )
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, raw, **kwargs):
+    if not raw:
+        search.index_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def index_saved_comment(sender, instance, raw, **kwargs):
+    if not raw:
+        search.index_comment(instance)
+
+
+@receiver(post_save, sender=Group)
+def index_saved_group(sender, instance, raw, **kwargs):
+    if not raw:
+        search.index_group(instance)
+
+
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Group)
+def remove_from_index(sender, instance, **kwargs):
+    search.delete(sender._meta.model_name, instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_index(sender, instance, **kwargs):
+    search.delete_post(instance.pk)
@@ -0,0 +1,83 @@
+"""Потоковые ленты RSS и Atom.
+
+Генераторы django.utils.feedgenerator собирают все элементы в список и
+пишут документ целиком. Здесь документ без элементов пишется обычным
+генератором и разрезается перед закрывающими тегами, а элементы
+пишутся по одному между ними, так что в памяти не больше STREAM_CHUNK
+символов текста.
+"""
+from io import StringIO
+
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.text import Truncator
+from django.utils.xmlutils import SimplerXMLGenerator
+
+ENCODING = 'utf-8'
+STREAM_CHUNK = 64 * 1024
+
+
+class StreamingFeedMixin:
+    # Дата ленты известна заранее: элементов в self.items нет.
+    updated = None
+
+    def latest_post_date(self):
+        return self.updated or super().latest_post_date()
+
+
+class RssFeed(StreamingFeedMixin, Rss201rev2Feed):
+    item_tag = 'item'
+    closing = '</channel></rss>'
+
+
+class AtomFeed(StreamingFeedMixin, Atom1Feed):
+    item_tag = 'entry'
+    closing = '</feed>'
+
+
+FEEDS = {'rss': RssFeed, 'atom': AtomFeed}
+
+
+def post_item(post, link):
+    """Аргументы add_item для поста."""
+    return {
+        'title': Truncator(post.text).words(8),
+        'link': link,
+        'unique_id': link,
+        'description': post.text,
+        'pubdate': post.pub_date,
+        'updateddate': post.updated_at,
+        'author_name': post.author.get_full_name() or post.author.username,
+        'categories': (post.group.title,) if post.group_id else (),
+    }
+
+
+def stream_feed(feed, items):
+    """Текст ленты кусками; items - итератор аргументов add_item."""
+    document = feed.writeString(ENCODING)
+    head, closing, tail = document.rpartition(feed.closing)
+    yield head
+    buffer = StringIO()
+    handler = SimplerXMLGenerator(buffer, ENCODING)
+    for item in items:
+        feed.add_item(**item)
+        item = feed.items.pop()
+        handler.startElement(feed.item_tag, feed.item_attributes(item))
+        feed.add_item_elements(handler, item)
+        handler.endElement(feed.item_tag)
+        if buffer.tell() >= STREAM_CHUNK:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+    yield closing + tail
+
+
+class FeedConverter:
+    """Формат ленты в адресе: /rss/ или /atom/."""
+    regex = '|'.join(FEEDS)
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
@@ -0,0 +1,53 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+from core.metrics import record_cache
+from posts.cache import card_key
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_list.html'
+
+
+@register.inclusion_tag(CARD_TEMPLATE)
+def post_card(post, eager=False, group_link=True):
+    """Карточка поста в ленте вместе со ссылкой на группу.
+
+    Шаблон карточки получает только пост, а не весь контекст страницы,
+    поэтому переменные строки ищутся в одном словаре, а не в стеке
+    контекстов, как у {% include %}. group_link=False - без ссылки, на
+    странице самой группы.
+    """
+    return {'post': post, 'eager': eager, 'group_link': group_link}
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts, group_link=True):
+    """Карточки всех постов страницы из кеша фрагментов, по порядку.
+
+    Ключи всех карточек запрашиваются одним get_many, рендерятся и
+    сохраняются только недостающие. Новый пост сдвигает ленту, но
+    остальные карточки берутся из кеша, а правка поста меняет ключ
+    только его карточки.
+    """
+    posts = list(posts)
+    keys = [
+        card_key(post, number == 0, group_link)
+        for number, post in enumerate(posts)
+    ]
+    cards = cache.get_many(keys)
+    missing = {}
+    template = context.template.engine.get_template(CARD_TEMPLATE)
+    for number, (key, post) in enumerate(zip(keys, posts)):
+        record_cache(hit=key in cards, cache='card')
+        if key not in cards:
+            missing[key] = template.render(context.new({
+                'post': post,
+                'eager': number == 0,
+                'group_link': group_link,
+            }))
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_TIMEOUT)
+        cards.update(missing)
+    return [mark_safe(cards[key]) for key in keys]
@@ -0,0 +1,38 @@
+from django import template
+from posts.thumbnails import (
+    DETAIL, FEED, FEED_GEOMETRY, SIZES, pick_src, ready_variants,
+)
+
+register = template.Library()
+
+SRC_WIDTH = int(FEED_GEOMETRY.split('x')[0])
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(post, kind=FEED, eager=False):
+    """Картинка поста с srcset из готовых размеров.
+
+    eager - картинка видна без прокрутки (первый пост ленты, страница
+    поста) и загружается сразу, остальные - лениво. Пока размеры
+    создаются, в ленте показывается заглушка тех же пропорций, на
+    странице поста - оригинал.
+    """
+    thumbnails = ready_variants(post, kind)
+    context = {
+        'post': post,
+        'kind': kind,
+        'eager': eager,
+        'feed_geometry': FEED_GEOMETRY.replace('x', ' / '),
+    }
+    if thumbnails:
+        src = pick_src(thumbnails, SRC_WIDTH)
+        context.update({
+            'src': src,
+            'srcset': ', '.join(
+                f'{image.url} {image.width}w' for image in thumbnails
+            ),
+            'sizes': SIZES[kind],
+        })
+    elif kind == DETAIL and post.image:
+        context['original'] = post.image
+    return context
@@ -0,0 +1,62 @@
+from itertools import count
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Comment, Follow, Post
+from posts.paginators import EstimatedCountPaginator
+
+User = get_user_model()
+numbers = count()
+
+
+class AdminChangelistTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+
+    def setUp(self):
+        self.client.force_login(AdminChangelistTests.admin)
+
+    def add_rows(self, number):
+        for _ in range(number):
+            index = next(numbers)
+            author = User.objects.create_user(username=f'author{index}')
+            post = Post.objects.create(author=author, text=f'Пост {index}')
+            Comment.objects.create(author=author, post=post, text='Ок')
+            Follow.objects.create(
+                user=AdminChangelistTests.admin, author=author
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelists_do_not_grow_with_rows(self):
+        for name in ('posts_post', 'posts_comment', 'posts_follow'):
+            url = reverse(f'admin:{name}_changelist')
+            with self.subTest(name=name):
+                self.add_rows(2)
+                few = self.count_queries(url)
+                self.add_rows(10)
+                self.assertEqual(self.count_queries(url), few)
+
+    def test_estimated_count_for_unfiltered_list(self):
+        self.add_rows(3)
+        paginator = EstimatedCountPaginator(Post.objects.all(), 100)
+        paginator.exact_count_limit = 1
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 3)
+        self.assertNotIn('COUNT', queries[0]['sql'])
+        filtered = EstimatedCountPaginator(
+            Post.objects.filter(pk=Post.objects.first().pk), 100
+        )
+        filtered.exact_count_limit = 1
+        self.assertEqual(filtered.count, 1)
@@ -1,13 +1,14 @@
 import shutil
 import tempfile
-
 from datetime import date
+from io import BytesIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 from posts.models import Comment, Group, Post
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -137,6 +138,75 @@ class PostCreateFormTests(TestCase):
         self.assertEqual(post_edit.image, 'posts/small_new.gif')
 
 
+def make_image(size, image_format='JPEG', **params):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'teal').save(buffer, image_format, **params)
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(ImageUploadTests.user)
+
+    def upload(self, name, content):
+        return self.client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с фото',
+            'image': SimpleUploadedFile(name, content, 'image/jpeg'),
+        })
+
+    def test_large_photo_is_downscaled_and_stripped(self):
+        exif = Image.Exif()
+        exif[0x0110] = 'Camera'
+        self.upload('photo.png', make_image(
+            (3000, 2000), exif=exif.tobytes()
+        ))
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/photo.jpg')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (1920, 1280))
+            self.assertEqual(image.format, 'JPEG')
+            self.assertTrue(image.info.get('progressive'))
+            self.assertNotIn('exif', image.info)
+
+    def test_small_image_is_kept(self):
+        content = make_image((100, 50))
+        self.upload('small.jpg', content)
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/small.jpg')
+        with post.image.open('rb') as stored:
+            self.assertEqual(stored.read(), content)
+
+    @override_settings(IMAGE_MAX_UPLOAD_SIZE=1024)
+    def test_too_large_file_is_rejected(self):
+        response = self.upload('big.jpg', make_image(
+            (500, 500), quality=100
+        ))
+        self.assertFalse(Post.objects.exists())
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 1,0\xa0КБ.'
+        )
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_are_rejected(self):
+        response = self.upload('wide.jpg', make_image((20, 20)))
+        self.assertFalse(Post.objects.exists())
+        self.assertTrue(response.context['form'].has_error(
+            'image', 'too_many_pixels'
+        ))
+
+
 class CommentCreateFormTests(TestCase):
 
     @classmethod
@@ -1,6 +1,11 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
-from posts.models import Comment, Follow, Group, Post
+from posts.management.commands.explain_feeds import CountQuery
+from posts.models import Comment, Follow, Group, Post, UserCounter
 
 User = get_user_model()
 
@@ -161,3 +166,118 @@ class ModelTestFollow(TestCase):
         for label, expected_label in labels_list.items():
             with self.subTest(label=label):
                 self.assertEqual(label, expected_label)
+
+
+class FeedIndexesTest(TestCase):
+    def test_feed_queries_use_indexes(self):
+        out = StringIO()
+        call_command('explain_feeds', stdout=out)
+        plan = out.getvalue()
+        for index in (
+            'post_pub_date_id_idx',
+            'post_author_pub_date_idx',
+            'post_group_pub_date_idx',
+            'comment_post_created_id_idx',
+        ):
+            with self.subTest(index=index):
+                self.assertIn(index, plan)
+
+    def test_count_plan_is_the_paginator_count(self):
+        post_list = Post.objects.filter(group_id=1)
+        query = CountQuery(post_list)
+        sql, params = query.sql(connection)
+        self.assertIn('COUNT(*)', sql)
+        self.assertEqual(list(params), [1])
+        self.assertIn('posts_post', query.explain())
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='pit')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.group_second = Group.objects.create(
+            title='Тестовая группа2',
+            slug='test-slug-second',
+            description='Тестовое описание2',
+        )
+
+    def counter(self, user):
+        return UserCounter.objects.get(user=user)
+
+    def test_post_counters(self):
+        post = Post.objects.create(
+            author=CountersTest.author,
+            text='Тестовый пост',
+            group=CountersTest.group,
+        )
+        self.assertEqual(self.counter(CountersTest.author).posts_count, 1)
+        CountersTest.group.refresh_from_db()
+        self.assertEqual(CountersTest.group.posts_count, 1)
+        post.group = CountersTest.group_second
+        post.save()
+        CountersTest.group.refresh_from_db()
+        CountersTest.group_second.refresh_from_db()
+        self.assertEqual(CountersTest.group.posts_count, 0)
+        self.assertEqual(CountersTest.group_second.posts_count, 1)
+        post.delete()
+        CountersTest.group_second.refresh_from_db()
+        self.assertEqual(self.counter(CountersTest.author).posts_count, 0)
+        self.assertEqual(CountersTest.group_second.posts_count, 0)
+
+    def test_comment_counter_survives_stale_save(self):
+        post = Post.objects.create(
+            author=CountersTest.author,
+            text='Тестовый пост',
+        )
+        stale_post = Post.objects.get(pk=post.pk)
+        Comment.objects.create(
+            text='Комментарий',
+            author=CountersTest.user,
+            post=post,
+        )
+        stale_post.text = 'Изменённый пост'
+        stale_post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.text, 'Изменённый пост')
+
+    def test_follow_counters(self):
+        follow = Follow.objects.create(
+            user=CountersTest.user,
+            author=CountersTest.author,
+        )
+        self.assertEqual(self.counter(CountersTest.user).following_count, 1)
+        self.assertEqual(self.counter(CountersTest.author).followers_count, 1)
+        follow.delete()
+        self.assertEqual(self.counter(CountersTest.user).following_count, 0)
+        self.assertEqual(self.counter(CountersTest.author).followers_count, 0)
+
+    def test_recount_counters(self):
+        Post.objects.create(author=CountersTest.author, text='Пост')
+        Follow.objects.create(
+            user=CountersTest.user,
+            author=CountersTest.author,
+        )
+        UserCounter.objects.all().delete()
+        Group.objects.update(posts_count=10)
+        call_command('recount_counters', stdout=StringIO())
+        author_counter = self.counter(CountersTest.author)
+        self.assertEqual(author_counter.posts_count, 1)
+        self.assertEqual(author_counter.followers_count, 1)
+        self.assertEqual(self.counter(CountersTest.user).following_count, 1)
+        CountersTest.group.refresh_from_db()
+        self.assertEqual(CountersTest.group.posts_count, 0)
+
+    def test_user_delete_with_counters(self):
+        user = User.objects.create_user(username='tom')
+        Post.objects.create(author=user, text='Пост')
+        Follow.objects.create(user=user, author=CountersTest.author)
+        user.delete()
+        self.assertEqual(self.counter(CountersTest.author).followers_count, 0)
@@ -1,16 +1,42 @@
+import json
+import os
 import shutil
 import tempfile
+import time
+import warnings
 from datetime import date
+from io import StringIO
+from unittest import mock
+from xml.dom import minidom
 
 from django import forms
 from django.conf import settings
-from django.contrib.auth import get_user_model
+from django.contrib.auth import SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.cached_db import SessionStore
 from django.core.cache import cache
-from django.core.cache.utils import make_template_fragment_key
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
-from django.urls import reverse
-from posts.models import Comment, Follow, Group, Post
+from django.core.management import call_command
+from django.core.paginator import UnorderedObjectListWarning
+from django.db import connection
+from django.db.models import Count
+from django.test import (Client, RequestFactory, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils.http import http_date
+from posts import bulk
+from posts.benchmark import data as benchmark_data
+from posts.benchmark import runner as benchmark_runner
+from posts.benchmark import templates as benchmark_templates
+from posts.benchmark import writes as benchmark_writes
+from posts.cache import get_versions, page_key, version_key
+from posts.counters import get_user_counter
+from posts.management.commands.warm_thumbnails import warm
+from posts.models import (Comment, Follow, Group, Post, TimelineEntry,
+                          UserCounter)
+from posts.stemmer import stem
+from posts.thumbnails import generate, schedule
+from posts.timeline import TimelinePaginator, timeline_parts
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -228,6 +254,71 @@ class PaginatorViewsTest(TestCase):
         self.assertEqual(len(response.context['page_obj']), 3)
 
 
+class CursorPaginatorViewsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_author = User.objects.create_user(username='pit')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Текстовое описание',
+        )
+        for i in range(13):
+            Post.objects.create(
+                author=cls.user_author,
+                text=f'Тестовый пост {i}',
+                group=CursorPaginatorViewsTest.group
+            )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(CursorPaginatorViewsTest.user_author)
+
+    def test_cursor_pages_of_feeds(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'pit'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first_page = self.client.get(
+                    url, {'cursor': ''}
+                ).context['page_obj']
+                self.assertEqual(len(first_page), 10)
+                self.assertFalse(first_page.has_previous())
+                second_page = self.client.get(
+                    url, {'cursor': first_page.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(len(second_page), 3)
+                self.assertFalse(second_page.has_next())
+                previous_page = self.client.get(
+                    url, {'cursor': second_page.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(
+                    list(previous_page.object_list),
+                    list(first_page.object_list)
+                )
+                self.assertFalse(previous_page.has_previous())
+
+    def test_invalid_cursor_returns_first_page(self):
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'не-курсор'}
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 10)
+        self.assertFalse(page_obj.has_previous())
+
+    @override_settings(POSTS_PAGINATION='cursor')
+    def test_cursor_mode_by_default(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertTrue(response.context['page_obj'].is_cursor)
+        response = self.client.get(reverse('posts:index'), {'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+
 class PostPresentTest(TestCase):
 
     @classmethod
@@ -251,6 +342,7 @@ class PostPresentTest(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.client = Client()
 
     def test_index_contain_post(self):
@@ -291,6 +383,14 @@ class PostPresentTest(TestCase):
                 post_get = post
         self.assertIsNone(post_get)
 
+    def test_group_link_in_feed_cards(self):
+        group_url = reverse(
+            'posts:group_list', kwargs={'slug': 'test-slug-first'}
+        )
+        link = f'<a href="{group_url}">'
+        self.assertContains(self.client.get(reverse('posts:index')), link)
+        self.assertNotContains(self.client.get(group_url), link)
+
 
 class CommentTest(TestCase):
 
@@ -382,6 +482,11 @@ class CacheTests(TestCase):
         cls.user_author = User.objects.create_user(
             username='pit',
         )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Текстовое описание',
+        )
         for i in range(100, 113):
             Post.objects.create(
                 text=f'Тест {i}',
@@ -390,14 +495,16 @@ class CacheTests(TestCase):
         cls.post = Post.objects.create(
             author=cls.user_author,
             text='Тестовый пост',
+            group=cls.group,
         )
 
     def setUp(self):
+        cache.clear()
         self.authorized_author_client = Client()
         self.authorized_author_client.force_login(CacheTests.user_author)
+        self.guest_client = Client()
 
     def test_index_cache(self):
-
         response_page1 = self.authorized_author_client.get(
             reverse('posts:index')
         )
@@ -406,49 +513,317 @@ class CacheTests(TestCase):
             {'page': 2}
         )
         self.assertNotEqual(response_page1.content, response_page2.content)
-        self.assertIsNotNone(response_page1)
-        key = make_template_fragment_key(
-            'index_page',
-            [response_page1.context['page_obj'].number, ]
-        )
-        cach_page = cache.get(key)
-        self.assertIsNotNone(cach_page)
-        CacheTests.post.delete()
+        with self.assertNumQueries(0):
+            response_cached = self.authorized_author_client.get(
+                reverse('posts:index')
+            )
+        self.assertEqual(response_cached.content, response_page1.content)
+        Post.objects.filter(pk=CacheTests.post.pk).update(text='Без сигнала')
+        response_not_bumped = self.authorized_author_client.get(
+            reverse('posts:index')
+        )
+        self.assertEqual(response_not_bumped.content, response_page1.content)
         Post.objects.create(
             author=CacheTests.user_author,
             text='Тестовый пост2',
         )
-        response_befor_clear_cache = self.authorized_author_client.get(
+        response_after_create = self.authorized_author_client.get(
             reverse('posts:index')
         )
-        self.assertIsNotNone(response_befor_clear_cache)
-        key_after_del = make_template_fragment_key(
-            'index_page',
-            [response_befor_clear_cache.context['page_obj'].number, ]
-        )
-        cach_page_after_del = cache.get(key_after_del)
-        self.assertIsNotNone(cach_page_after_del)
-        self.assertEqual(cach_page, cach_page_after_del)
-        self.assertEqual(
-            response_befor_clear_cache.content,
+        self.assertNotEqual(
+            response_after_create.content,
             response_page1.content
         )
-        cache.clear()
-        response_after_clear_cache = self.authorized_author_client.get(
+        self.assertContains(response_after_create, 'Тестовый пост2')
+
+    def test_cache_is_per_viewer(self):
+        guest_response = self.guest_client.get(reverse('posts:index'))
+        author_response = self.authorized_author_client.get(
             reverse('posts:index')
         )
-        self.assertIsNotNone(response_after_clear_cache)
-        key_after_clear = make_template_fragment_key(
-            'index_page',
-            [response_after_clear_cache.context['page_obj'].number, ]
+        self.assertIsNotNone(author_response.context)
+        self.assertNotEqual(guest_response.content, author_response.content)
+
+    def test_renames_bump_index_and_version_keys_are_ascii(self):
+        group = Group.objects.get(pk=CacheTests.group.pk)
+        names = ('index', f'group:{group.slug}', 'group:Новый слаг')
+        versions = get_versions(names)
+        group.slug = 'Новый слаг'
+        group.save()
+        bumped = get_versions(names)
+        for name in names:
+            self.assertNotEqual(bumped[name], versions[name])
+        self.assertTrue(version_key('group:Новый слаг').isascii())
+        self.assertNotIn(' ', version_key('group:Новый слаг'))
+        user = User.objects.get(pk=CacheTests.user_author.pk)
+        versions = get_versions(['index'])
+        user.username = 'renamed'
+        user.save()
+        self.assertNotEqual(get_versions(['index']), versions)
+
+    def page_key_for(self, params=None, session_key=None):
+        request = RequestFactory().get(reverse('posts:index'), params)
+        request.resolver_match = resolve(request.path_info)
+        if session_key:
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = session_key
+        request.session = SessionStore(session_key)
+        return page_key(request)
+
+    def test_unknown_params_and_sessions_share_anonymous_page(self):
+        anonymous = self.page_key_for()
+        self.assertEqual(self.page_key_for({'x': '1'}), anonymous)
+        self.assertEqual(
+            self.page_key_for(session_key='forgedsessionkey0001'), anonymous
         )
-        cach_page_after_clear = cache.get(key_after_clear)
-        self.assertIsNotNone(cach_page_after_clear)
-        self.assertNotEqual(cach_page, cach_page_after_clear)
+        self.assertNotEqual(self.page_key_for({'page': '2'}), anonymous)
+        session = SessionStore()
+        session[SESSION_KEY] = str(CacheTests.user_author.pk)
+        session.create()
         self.assertNotEqual(
-            response_after_clear_cache.content,
-            response_page1.content
+            self.page_key_for(session_key=session.session_key), anonymous
+        )
+
+    def test_targeted_invalidation(self):
+        group_url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': CacheTests.post.pk}
+        )
+        profile_url = reverse('posts:profile', kwargs={'username': 'pit'})
+        other_user = User.objects.create_user(username='tom')
+        other_post = Post.objects.create(author=other_user, text='Чужой')
+        for url in (group_url, detail_url, profile_url):
+            self.guest_client.get(url)
+        Comment.objects.create(
+            author=other_user, post=other_post, text='Комментарий'
+        )
+        for url in (group_url, detail_url, profile_url):
+            with self.subTest(url=url):
+                self.assertIsNone(self.guest_client.get(url).context)
+        Comment.objects.create(
+            author=other_user, post=CacheTests.post, text='Комментарий'
         )
+        for url in (group_url, detail_url, profile_url):
+            with self.subTest(url=url):
+                self.assertIsNotNone(self.guest_client.get(url).context)
+        Follow.objects.create(user=other_user, author=CacheTests.user_author)
+        self.assertIsNotNone(self.guest_client.get(profile_url).context)
+        self.assertIsNone(self.guest_client.get(group_url).context)
+
+    def test_conditional_get(self):
+        url = reverse('posts:profile', kwargs={'username': 'pit'})
+        response = self.guest_client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        with self.assertNumQueries(0):
+            response_etag = self.guest_client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response_etag.status_code, 304)
+        self.assertEqual(response_etag.content, b'')
+        response_date = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response_date.status_code, 304)
+        self.assertEqual(
+            self.authorized_author_client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            ).status_code,
+            200,
+        )
+        self.assertIn(
+            'private',
+            self.authorized_author_client.get(url)['Cache-Control'],
+        )
+        other_user = User.objects.create_user(username='tom')
+        Follow.objects.create(user=other_user, author=CacheTests.user_author)
+        response_changed = self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response_changed.status_code, 200)
+        self.assertNotEqual(response_changed['ETag'], response['ETag'])
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='carder')
+        cls.group = Group.objects.create(
+            title='Группа', slug='cards', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Карточка {number}', author=cls.author, group=cls.group
+            )
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def rendered_cards(self, url):
+        response = self.client.get(url)
+        return response, [
+            template.name for template in response.templates
+        ].count('posts/includes/post_list.html')
+
+    def test_only_changed_cards_are_rendered(self):
+        url = reverse('posts:index')
+        _, rendered = self.rendered_cards(url)
+        self.assertEqual(rendered, 3)
+        Post.objects.create(text='Новая карточка', author=self.author)
+        response, rendered = self.rendered_cards(url)
+        # Новый пост и бывший первый: у первой карточки свой ключ.
+        self.assertEqual(rendered, 2)
+        self.assertContains(response, 'Новая карточка')
+        self.assertContains(response, 'Карточка 0')
+
+        post = self.posts[0]
+        updated_at = post.updated_at
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            {'text': 'Исправленная карточка', 'group': self.group.pk},
+        )
+        post.refresh_from_db()
+        self.assertGreater(post.updated_at, updated_at)
+        response, rendered = self.rendered_cards(url)
+        self.assertEqual(rendered, 1)
+        self.assertContains(response, 'Исправленная карточка')
+        self.assertNotContains(response, 'Карточка 0')
+
+    def test_comment_count_changes_card(self):
+        url = reverse('posts:group_list', kwargs={'slug': 'cards'})
+        self.rendered_cards(url)
+        Comment.objects.create(
+            post=self.posts[1], author=self.author, text='Комментарий'
+        )
+        response, rendered = self.rendered_cards(url)
+        self.assertEqual(rendered, 1)
+        self.assertContains(response, 'Комментариев: 1')
+
+
+@override_settings(FEED_ITEMS=3, STREAM_CHUNK_SIZE=2)
+class FeedExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='writer', first_name='Лев', last_name='Толстой'
+        )
+        cls.other = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Романы', slug='novels', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Глава {number}', author=cls.author,
+                group=cls.group if number % 2 else None,
+            )
+            for number in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def content(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_feeds(self):
+        url = reverse('posts:index_feed', kwargs={'kind': 'rss'})
+        self.assertContains(self.client.get(reverse('posts:index')), url)
+        response = self.client.get(url)
+        self.assertEqual(
+            response['Content-Type'], 'application/rss+xml; charset=utf-8'
+        )
+        document = minidom.parseString(self.content(response))
+        titles = [
+            item.getElementsByTagName('title')[0].firstChild.data
+            for item in document.getElementsByTagName('item')
+        ]
+        self.assertEqual(titles, ['Глава 4', 'Глава 3', 'Глава 2'])
+        response = self.client.get(reverse(
+            'posts:group_feed', kwargs={'slug': 'novels', 'kind': 'atom'}
+        ))
+        document = minidom.parseString(self.content(response))
+        self.assertEqual(len(document.getElementsByTagName('entry')), 2)
+        response = self.client.get(reverse(
+            'posts:profile_feed', kwargs={'username': 'writer', 'kind': 'rss'}
+        ))
+        self.assertIn('Записи Лев Толстой', self.content(response))
+
+    def test_feed_conditional_get(self):
+        url = reverse('posts:index_feed', kwargs={'kind': 'atom'})
+        response = self.client.get(url)
+        self.content(response)
+        with self.assertNumQueries(0):
+            response_etag = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response_etag.status_code, 304)
+        with self.assertNumQueries(0):
+            response_date = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+            )
+        self.assertEqual(response_date.status_code, 304)
+        post = self.posts[4]
+        post.text = 'Глава 4, исправленная'
+        post.save()
+        response_changed = self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response_changed.status_code, 200)
+        self.assertIn('Глава 4, исправленная', self.content(response_changed))
+
+    def test_feed_last_modified_moves_on_delete(self):
+        url = reverse(
+            'posts:group_feed', kwargs={'slug': 'novels', 'kind': 'rss'}
+        )
+        response = self.client.get(url)
+        self.content(response)
+        later = time.time() + 60
+        with mock.patch('posts.cache.time.time', return_value=later):
+            self.posts[3].delete()
+        response_date = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response_date.status_code, 200)
+        self.assertNotIn('Глава 3', self.content(response_date))
+        self.assertEqual(response_date['Last-Modified'], http_date(later))
+
+    def test_export(self):
+        url = reverse('posts:profile_export', kwargs={'username': 'writer'})
+        self.assertEqual(self.client.get(url).status_code, 302)
+        reader = Client()
+        reader.force_login(self.other)
+        self.assertRedirects(
+            reader.get(url),
+            reverse('posts:profile', kwargs={'username': 'writer'}),
+        )
+        response = self.author_client.get(url)
+        self.assertIn('writer-posts.jsonl', response['Content-Disposition'])
+        rows = [
+            json.loads(line)
+            for line in self.content(response).splitlines()
+        ]
+        self.assertEqual(
+            [row['text'] for row in rows],
+            [f'Глава {number}' for number in range(4, -1, -1)],
+        )
+        self.assertEqual(rows[1]['group'], 'novels')
+        # Только пользователь для login_required: сессия - из кеша.
+        with self.assertNumQueries(1):
+            response_etag = self.author_client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response_etag.status_code, 304)
+        response = self.author_client.get(url, {'format': 'csv'})
+        lines = self.content(response).splitlines()
+        self.assertEqual(
+            lines[0], 'id,text,pub_date,updated_at,group,image'
+        )
+        self.assertEqual(len(lines), 6)
 
 
 class FollowTests(TestCase):
@@ -571,3 +946,760 @@ class FollowTests(TestCase):
             reverse('posts:follow_index')
         )
         self.assertEqual(len(response.context['page_obj']), 0)
+
+
+class TimelineTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='pit')
+        cls.user_author = User.objects.create_user(username='ioan')
+        cls.user_celebrity = User.objects.create_user(username='star')
+        for i in range(7):
+            Post.objects.create(
+                author=cls.user_author,
+                text=f'Пост автора {i}',
+            )
+            Post.objects.create(
+                author=cls.user_celebrity,
+                text=f'Пост знаменитости {i}',
+            )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(TimelineTests.user)
+
+    def feed_texts(self, params=None):
+        texts = []
+        response = self.authorized_client.get(
+            reverse('posts:follow_index'), params
+        )
+        page_obj = response.context['page_obj']
+        texts.extend(post.text for post in page_obj)
+        if getattr(page_obj, 'is_cursor', False):
+            while page_obj.has_next():
+                response = self.authorized_client.get(
+                    reverse('posts:follow_index'),
+                    {'cursor': page_obj.next_cursor}
+                )
+                page_obj = response.context['page_obj']
+                texts.extend(post.text for post in page_obj)
+        elif page_obj.has_next():
+            texts.extend(self.feed_texts({'page': 2}))
+        return texts
+
+    def expected_texts(self):
+        return list(
+            Post.objects.filter(
+                author__following__user=TimelineTests.user
+            ).order_by('-pub_date', '-pk').values_list('text', flat=True)
+        )
+
+    def test_fan_out_on_follow_and_post(self):
+        Follow.objects.create(
+            user=TimelineTests.user,
+            author=TimelineTests.user_author,
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=TimelineTests.user).count(), 7
+        )
+        Post.objects.create(author=TimelineTests.user_author, text='Новый')
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=TimelineTests.user).count(), 8
+        )
+        self.assertEqual(self.feed_texts()[0], 'Новый')
+        self.authorized_client.get(
+            reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': TimelineTests.user_author}
+            )
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=TimelineTests.user).exists()
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_celebrity_posts_merged_on_read(self):
+        Follow.objects.create(
+            user=TimelineTests.user,
+            author=TimelineTests.user_author,
+        )
+        Follow.objects.create(
+            user=TimelineTests.user,
+            author=TimelineTests.user_celebrity,
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(
+                author=TimelineTests.user_celebrity
+            ).exists()
+        )
+        expected = self.expected_texts()
+        self.assertEqual(len(expected), 14)
+        self.assertEqual(self.feed_texts(), expected)
+        self.assertEqual(self.feed_texts({'cursor': ''}), expected)
+
+    def test_author_change_moves_post(self):
+        Follow.objects.create(
+            user=TimelineTests.user,
+            author=TimelineTests.user_author,
+        )
+        post = Post.objects.create(
+            author=TimelineTests.user_celebrity, text='Чужой пост'
+        )
+        post.author = TimelineTests.user_author
+        post.save()
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=TimelineTests.user, post=post
+            ).exists()
+        )
+        self.assertEqual(
+            UserCounter.objects.get(user=TimelineTests.user_author)
+            .posts_count, 8
+        )
+        self.assertEqual(
+            UserCounter.objects.get(user=TimelineTests.user_celebrity)
+            .posts_count, 7
+        )
+        post.author = TimelineTests.user_celebrity
+        post.save()
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.feed_texts(), self.expected_texts())
+
+    def test_timeline_paginator_ordered(self):
+        parts = timeline_parts(TimelineTests.user)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', UnorderedObjectListWarning)
+            TimelinePaginator(parts, settings.POSTS_NUMBER)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_former_celebrity_posts_backfilled(self):
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=fan, author=TimelineTests.user_celebrity)
+        Follow.objects.create(
+            user=TimelineTests.user,
+            author=TimelineTests.user_celebrity,
+        )
+        Post.objects.create(
+            author=TimelineTests.user_celebrity, text='Пост на пике'
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=TimelineTests.user).exists()
+        )
+        expected = self.expected_texts()
+        self.assertEqual(len(expected), 8)
+        self.assertEqual(self.feed_texts(), expected)
+        Follow.objects.filter(
+            user=fan, author=TimelineTests.user_celebrity
+        ).delete()
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=TimelineTests.user).count(), 8
+        )
+        self.assertFalse(
+            UserCounter.objects.get(
+                user=TimelineTests.user_celebrity
+            ).timeline_partial
+        )
+        self.assertEqual(self.feed_texts(), expected)
+        self.assertEqual(self.feed_texts({'cursor': ''}), expected)
+
+    def test_rebuild_timeline(self):
+        Follow.objects.create(
+            user=TimelineTests.user,
+            author=TimelineTests.user_author,
+        )
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timeline', stdout=StringIO())
+        self.assertEqual(self.feed_texts(), self.expected_texts())
+
+
+class QueryCountTests(TestCase):
+    """Число запросов страницы не должно зависеть от числа постов."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='pit')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Текстовое описание',
+        )
+        authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(5)
+        ]
+        for author in authors:
+            Follow.objects.create(user=cls.user, author=author)
+            for i in range(3):
+                cls.post = Post.objects.create(
+                    author=author,
+                    text=f'Тестовый пост {i}',
+                    group=cls.group,
+                )
+                Comment.objects.create(
+                    author=author,
+                    post=cls.post,
+                    text='Комментарий',
+                )
+        for commentator in authors:
+            Comment.objects.create(
+                author=commentator,
+                post=cls.post,
+                text='Комментарий',
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(QueryCountTests.user)
+
+    def assertMaxQueries(self, max_queries, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries),
+            max_queries,
+            '\n'.join(query['sql'] for query in queries.captured_queries)
+        )
+
+    def test_views_max_queries(self):
+        author = QueryCountTests.post.author.username
+        views_max_queries = {
+            reverse('posts:index'): 4,
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}): 4,
+            reverse('posts:profile', kwargs={'username': author}): 5,
+            reverse(
+                'posts:post_detail',
+                kwargs={'post_id': QueryCountTests.post.id}
+            ): 4,
+            reverse('posts:follow_index'): 6,
+        }
+        for url, max_queries in views_max_queries.items():
+            for params in ({'page': 1}, {'cursor': ''}):
+                with self.subTest(url=url, params=params):
+                    self.assertMaxQueries(max_queries, url, params)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_author = User.objects.create_user(username='ioan')
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x01\x00'
+            b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+            b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+            b'\x00\x00\x01\x00\x01\x00\x00\x02'
+            b'\x02\x4c\x01\x00\x3b'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user_author,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='thumb.gif',
+                content=small_gif,
+                content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_placeholder_until_thumbnail_ready(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, '<img class="card-img')
+        self.assertContains(response, 'aspect-ratio: 960 / 339')
+        generate(ThumbnailTests.post.pk, ThumbnailTests.post.image.name)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<img class="card-img')
+
+    def test_srcset_after_variants_ready(self):
+        post = ThumbnailTests.post
+        generate(post.pk, post.image.name)
+        response = self.client.get(reverse('posts:index'))
+        for width in settings.IMAGE_VARIANT_WIDTHS:
+            self.assertContains(response, f' {width}w')
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, 'sizes="')
+
+    def test_detail_uses_original_until_variants_ready(self):
+        post = ThumbnailTests.post
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        response = self.client.get(url)
+        self.assertContains(response, f'src="{post.image.url}"')
+        generate(post.pk, post.image.name)
+        response = self.client.get(url)
+        self.assertNotContains(response, f'src="{post.image.url}"')
+        self.assertContains(response, 'srcset="')
+        self.assertNotContains(response, 'loading="lazy"')
+
+    def test_only_first_feed_image_is_eager(self):
+        post = ThumbnailTests.post
+        Post.objects.create(
+            author=ThumbnailTests.user_author,
+            text='Второй пост с картинкой',
+            image=post.image.name,
+        )
+        generate(post.pk, post.image.name)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'loading="lazy"', count=1)
+
+    def test_warm_thumbnails(self):
+        self.assertTrue(warm(ThumbnailTests.post.image.name))
+        self.assertFalse(warm(ThumbnailTests.post.image.name))
+
+    def test_render_does_not_schedule(self):
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            self.client.get(reverse('posts:index'))
+        schedule.assert_not_called()
+
+    @mock.patch('posts.thumbnails._pending', set())
+    def test_failed_image_not_rescheduled(self):
+        post = ThumbnailTests.post
+        with mock.patch(
+            'posts.thumbnails.get_thumbnail', side_effect=OSError
+        ), self.assertLogs('posts.thumbnails', 'ERROR'):
+            generate(post.pk, post.image.name)
+        with mock.patch('posts.thumbnails.transaction.on_commit') as later:
+            schedule(post)
+        later.assert_not_called()
+        cache.clear()
+        with mock.patch('posts.thumbnails.transaction.on_commit') as later:
+            schedule(post)
+        later.assert_called_once()
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Любители книг',
+            slug='books',
+            description='Обсуждаем прочитанное',
+        )
+        cls.book_post = Post.objects.create(
+            author=cls.user,
+            group=cls.group,
+            text='Книга недели: прочитал книгу о красивых городах',
+        )
+        cls.other_post = Post.objects.create(
+            author=cls.user,
+            text='Сегодня гулял по парку',
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.other_post,
+            author=cls.user,
+            text='В парке продают книги',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return list(response.context['page_obj']), response
+
+    def test_stemmer(self):
+        for words in (
+            ('книга', 'книги', 'книгами', 'книгой'),
+            ('красивый', 'красивых', 'красивая'),
+            ('город', 'городах', 'городами'),
+        ):
+            self.assertEqual(len({stem(word) for word in words}), 1, words)
+
+    def test_word_forms_are_found_and_ranked(self):
+        posts, _ = self.search('книгами')
+        self.assertEqual(posts, [
+            SearchTests.book_post, SearchTests.other_post
+        ])
+        posts, _ = self.search('красивый город')
+        self.assertEqual(posts, [SearchTests.book_post])
+
+    def test_groups_are_found(self):
+        _, response = self.search('любителей книги')
+        self.assertEqual(
+            list(response.context['groups']), [SearchTests.group]
+        )
+
+    def test_index_follows_changes(self):
+        post = Post.objects.get(pk=SearchTests.other_post.pk)
+        post.text = 'Сегодня катался на велосипеде'
+        post.save()
+        self.assertEqual(self.search('велосипед')[0], [post])
+        self.assertEqual(self.search('парк')[0], [post])
+        Comment.objects.filter(pk=SearchTests.comment.pk).delete()
+        self.assertEqual(self.search('парк')[0], [])
+        Post.objects.filter(pk=SearchTests.book_post.pk).delete()
+        self.assertEqual(self.search('книга')[0], [])
+
+    def test_deleted_post_takes_comments_out_of_index(self):
+        Post.objects.filter(pk=SearchTests.other_post.pk).delete()
+        posts, response = self.search('парк')
+        self.assertEqual(posts, [])
+        self.assertEqual(response.context['page_obj'].paginator.count, 0)
+        call_command('rebuild_search_index', stdout=StringIO())
+        posts, response = self.search('книги')
+        self.assertEqual(posts, [SearchTests.book_post])
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+
+    def test_pagination_keeps_query(self):
+        Post.objects.bulk_create(
+            Post(author=SearchTests.user, text=f'Книга номер {number}')
+            for number in range(settings.POSTS_NUMBER)
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        posts, response = self.search('книга', page=2)
+        self.assertEqual(response.context['page_obj'].paginator.count, 12)
+        self.assertEqual(len(posts), 2)
+        self.assertContains(
+            response, '?q=%D0%BA%D0%BD%D0%B8%D0%B3%D0%B0&amp;page=1'
+        )
+
+    def test_search_reads_through_router(self):
+        with mock.patch(
+            'posts.search.router.db_for_read', return_value='default'
+        ) as db_for_read:
+            self.search('книга')
+        db_for_read.assert_any_call(Post)
+
+    def test_empty_query(self):
+        response = self.client.get(reverse('posts:search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('page_obj', response.context)
+
+
+class BulkDataTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='importer')
+        cls.group = Group.objects.create(
+            title='Импорт', slug='import', description='Описание'
+        )
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def path(self, name):
+        return f'{self.directory}/{name}'
+
+    def test_roundtrip_keeps_dates_and_refreshes_derived(self):
+        for format_name in ('jsonl', 'csv'):
+            with self.subTest(format=format_name):
+                Post.objects.all().delete()
+                post = Post.objects.create(
+                    author=BulkDataTests.user,
+                    group=BulkDataTests.group,
+                    text='Перенесённая запись',
+                )
+                Post.objects.filter(pk=post.pk).update(
+                    pub_date=post.pub_date.replace(year=2020)
+                )
+                Comment.objects.create(
+                    post=post, author=BulkDataTests.user, text='Комментарий'
+                )
+                posts_path = self.path(f'posts.{format_name}')
+                comments_path = self.path(f'comments.{format_name}')
+                call_command('export_data', 'post', posts_path,
+                             stderr=StringIO())
+                call_command('export_data', 'comment', comments_path,
+                             stderr=StringIO())
+                Comment.objects.all().delete()
+                Post.objects.all().delete()
+                call_command('import_data', 'post', posts_path,
+                             batch_size=1, stderr=StringIO())
+                call_command('import_data', 'comment', comments_path,
+                             stderr=StringIO())
+                imported = Post.objects.get(pk=post.pk)
+                self.assertEqual(imported.pub_date.year, 2020)
+                self.assertEqual(imported.group, BulkDataTests.group)
+                self.assertEqual(imported.comments_count, 1)
+                response = self.client.get(
+                    reverse('posts:search'), {'q': 'перенесённые'}
+                )
+                self.assertEqual(
+                    list(response.context['page_obj']), [imported]
+                )
+
+    def test_resume_skips_checkpointed_rows(self):
+        path = self.path('follows.jsonl')
+        authors = [
+            User.objects.create_user(username=f'author{number}')
+            for number in range(3)
+        ]
+        with open(path, 'w') as stream:
+            for author in authors:
+                stream.write(
+                    f'{{"user_id": {BulkDataTests.user.pk}, '
+                    f'"author_id": {author.pk}}}\n'
+                )
+        with open(f'{path}.checkpoint', 'w') as checkpoint:
+            checkpoint.write('{"rows": 2}')
+        output = StringIO()
+        call_command('import_data', 'follow', path, resume=True,
+                     stderr=output)
+        self.assertEqual(
+            list(Follow.objects.values_list('author', flat=True)),
+            [authors[2].pk],
+        )
+        self.assertIn('строк/с', output.getvalue())
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+        self.assertEqual(
+            BulkDataTests.user.counter.following_count, 1
+        )
+
+    def test_reimport_reports_skipped_rows_and_bumps_pages(self):
+        post = Post.objects.create(
+            author=BulkDataTests.user,
+            group=BulkDataTests.group,
+            text='Пост для повторной загрузки',
+        )
+        path = self.path('posts.jsonl')
+        call_command('export_data', 'post', path, stderr=StringIO())
+        names = ('index', 'group:import', 'profile:importer')
+        versions = get_versions(names)
+        output = StringIO()
+        call_command('import_data', 'post', path, stderr=output)
+        self.assertIn('новых: 0, уже были в базе: 1', output.getvalue())
+        bumped = get_versions(names)
+        for name in names:
+            self.assertNotEqual(bumped[name], versions[name])
+        Post.objects.filter(pk=post.pk).delete()
+        with open(path, 'a') as stream:
+            stream.write(
+                f'{{"text": "Без id", "author_id": {BulkDataTests.user.pk},'
+                f' "pub_date": "2020-01-01T00:00:00+00:00"}}\n'
+            )
+        output = StringIO()
+        call_command('import_data', 'post', path, stderr=output)
+        self.assertIn('новых: 2, уже были в базе: 0', output.getvalue())
+
+    @mock.patch('posts.bulk.TRACK_LIMIT', 1)
+    def test_large_import_bumps_coarse_versions(self):
+        for number in range(3):
+            Comment.objects.create(
+                post=Post.objects.create(
+                    author=BulkDataTests.user, text=f'Пост {number}'
+                ),
+                author=BulkDataTests.user,
+                text=f'Комментарий {number}',
+            )
+        path = self.path('comments.jsonl')
+        call_command('export_data', 'comment', path, stderr=StringIO())
+        with open(path) as stream:
+            result = bulk.import_rows(
+                'comment', bulk.read_rows(stream, 'jsonl'), batch_size=1
+            )
+        self.assertTrue(result.coarse)
+        self.assertEqual(result.tracked(), 0)
+        names = ('posts', 'groups', 'profiles')
+        versions = get_versions(names)
+        bulk.refresh_derived('comment', result.pages())
+        bumped = get_versions(names)
+        for name in names:
+            self.assertNotEqual(bumped[name], versions[name])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_generated_graph_and_report(self):
+        benchmark_data.generate(
+            users=30, groups=3, posts=200, comments=100,
+            follows_per_user=10, image_ratio=0.5, batch_size=50,
+        )
+        followers = sorted(
+            Follow.objects.values('author').annotate(
+                total=Count('pk')
+            ).values_list('total', flat=True),
+            reverse=True,
+        )
+        self.assertGreater(followers[0], 3 * followers[len(followers) // 2])
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertTrue(Post.objects.filter(image='').exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+
+        report = benchmark_runner.run(
+            requests=3, warmup=1, memory_requests=1, cold_cache=True
+        )
+        self.assertEqual(
+            sorted(report['views']), sorted(benchmark_runner.VIEWS)
+        )
+        for result in report['views'].values():
+            self.assertEqual(
+                set(result['latency_ms']), {'p50', 'p95', 'p99', 'max'}
+            )
+            self.assertGreater(result['queries']['max'], 0)
+            self.assertGreater(result['memory_kb']['p50'], 0)
+        self.assertEqual(report['data']['posts'], 200)
+        self.assertEqual(len(benchmark_runner.compare(report, report)), 6)
+
+    def test_warm_cache_run_is_not_throttled(self):
+        benchmark_data.generate(
+            users=5, groups=1, posts=20, comments=0,
+            follows_per_user=2, image_ratio=0, batch_size=50,
+        )
+        capacity, _ = settings.THROTTLE_RATES['comment']
+        report = benchmark_runner.run(
+            views=('add_comment', 'index'), requests=capacity + 2,
+            warmup=1, memory_requests=1,
+        )
+        self.assertEqual(sorted(report['views']), ['add_comment', 'index'])
+        self.assertFalse(report['meta']['cold_cache'])
+
+
+class TemplateBenchmarkTests(TestCase):
+    def test_render_report(self):
+        report = benchmark_templates.run(sizes=(3,), repeat=2)
+        self.assertEqual(
+            sorted(report[3]),
+            [
+                'cached/fragments', 'cached/include', 'cached/tag',
+                'plain/fragments', 'plain/include', 'plain/tag',
+            ],
+        )
+        self.assertGreater(report[3]['cached/tag']['p50'], 0)
+
+
+class WriteBenchmarkTests(TransactionTestCase):
+    def test_concurrent_writes_report(self):
+        author = User.objects.create_user(username='writer')
+        post = Post.objects.create(text='Пост для записи', author=author)
+        report = benchmark_writes.run(threads=1, writes=5)
+        self.assertEqual(report['writes'] + report['errors'], 5)
+        self.assertEqual(
+            Comment.objects.filter(post=post).count(), report['writes']
+        )
+        self.assertGreater(report['writes_per_second'], 0)
+
+
+@override_settings(COMMENTS_NUMBER=3)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='commentator')
+        cls.post = Post.objects.create(
+            text='Обсуждаемый пост', author=cls.author
+        )
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Комментарий {number}'
+            )
+            for number in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_comments_in_order(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        page = response.context['comments']
+        self.assertEqual(list(page), self.comments[:3])
+        self.assertTrue(page.has_next())
+        self.assertContains(response, 'id="comments-more"')
+
+    def test_json_endpoint_loads_following_pages(self):
+        url = reverse('posts:post_comments', args=(self.post.pk,))
+        first = self.client.get(url).json()
+        self.assertIn('Комментарий 2', first['html'])
+        self.assertNotIn('Комментарий 3', first['html'])
+        with self.assertNumQueries(2):
+            second = self.client.get(first['next_url']).json()
+        self.assertIn('Комментарий 3', second['html'])
+        self.assertIn('Комментарий 4', second['html'])
+        self.assertIsNone(second['next_url'])
+
+    def test_json_endpoint_for_missing_post(self):
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.pk + 100,))
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class WritePathTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def counters(self):
+        return (
+            get_user_counter(User.objects.get(pk=self.user.pk))
+            .following_count,
+            get_user_counter(User.objects.get(pk=self.author.pk))
+            .followers_count,
+        )
+
+    def test_follow_and_unfollow_are_idempotent(self):
+        follow_url = reverse('posts:profile_follow', args=('writer',))
+        unfollow_url = reverse('posts:profile_unfollow', args=('writer',))
+        self.client.get(follow_url)
+        self.client.get(follow_url)
+        self.assertEqual(
+            Follow.objects.filter(user=self.user, author=self.author).count(),
+            1,
+        )
+        self.assertEqual(self.counters(), (1, 1))
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=self.post)
+            .exists()
+        )
+        self.client.get(unfollow_url)
+        self.client.get(unfollow_url)
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(self.counters(), (0, 0))
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+
+    def test_follow_unknown_author(self):
+        response = self.client.get(
+            reverse('posts:profile_follow', args=('nobody',))
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_comment_on_missing_post(self):
+        response = self.client.post(
+            reverse('posts:add_comment', args=(self.post.pk + 100,)),
+            {'text': 'Комментарий'},
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Comment.objects.exists())
+
+    @override_settings(THROTTLE_RATES={'comment': (2, 60)})
+    def test_comments_throttled(self):
+        url = reverse('posts:add_comment', args=(self.post.pk,))
+        for _ in range(2):
+            self.assertEqual(
+                self.client.post(url, {'text': 'Ещё'}).status_code, 302
+            )
+        response = self.client.post(url, {'text': 'Ещё'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(Comment.objects.count(), 2)
@@ -0,0 +1,161 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+logger = logging.getLogger(__name__)
+
+FEED = 'feed'
+DETAIL = 'detail'
+FEED_GEOMETRY = '960x339'
+FEED_OPTIONS = {'crop': 'center', 'upscale': True}
+DETAIL_OPTIONS = {}
+# Подсказки браузеру, какой ширины картинка будет на экране: лента
+# занимает контейнер целиком, пост - колонку col-md-9.
+SIZES = {
+    FEED: '(min-width: 1200px) 1110px, 100vw',
+    DETAIL: '(min-width: 768px) 75vw, 100vw',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    """Находит уже созданную миниатюру, ничего не декодируя."""
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+ready_backend = ReadyThumbnailBackend()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def failure_key(image_name):
+    return f'thumbnail-failed:{image_name}'
+
+
+def variants(kind):
+    """Пары (геометрия, опции) всех размеров картинки для ленты или поста.
+
+    В ленте картинка обрезается до пропорций FEED_GEOMETRY, на странице
+    поста только уменьшается по ширине.
+    """
+    widths = settings.IMAGE_VARIANT_WIDTHS
+    if kind == FEED:
+        feed_width, feed_height = map(int, FEED_GEOMETRY.split('x'))
+        return [
+            (f'{width}x{round(width * feed_height / feed_width)}',
+             FEED_OPTIONS)
+            for width in widths
+        ]
+    return [(str(width), DETAIL_OPTIONS) for width in widths]
+
+
+def all_variants():
+    return variants(FEED) + variants(DETAIL)
+
+
+def generate(post_id, image_name):
+    """Создаёт все размеры картинки и сбрасывает кеш страниц с постом.
+
+    updated_at сдвигается, чтобы карточка с заглушкой сменилась на
+    карточку с картинкой.
+    """
+    from posts.signals import bump_post_pages
+    from posts.models import Post
+
+    close_old_connections()
+    try:
+        for geometry, options in all_variants():
+            get_thumbnail(image_name, geometry, **options)
+        posts = Post.objects.filter(pk=post_id)
+        posts.update(updated_at=timezone.now())
+        post = posts.values_list('author_id', 'group_id').first()
+        if post:
+            bump_post_pages(post_id, *post)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру поста %s', post_id)
+        cache.set(
+            failure_key(image_name), True, settings.THUMBNAIL_RETRY_TIMEOUT
+        )
+    finally:
+        with _pending_lock:
+            _pending.discard(post_id)
+        close_old_connections()
+
+
+def schedule(post):
+    """Ставит создание миниатюр в фоновый пул после коммита транзакции.
+
+    При THUMBNAIL_WORKERS = 0 миниатюры создаются сразу, в том же потоке.
+    Картинки, на которых создание недавно упало, пропускаются.
+    """
+    if not post.image or cache.get(failure_key(post.image.name)):
+        return
+    with _pending_lock:
+        if post.pk in _pending:
+            return
+        _pending.add(post.pk)
+    args = (post.pk, post.image.name)
+    if not settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: generate(*args))
+        return
+    transaction.on_commit(lambda: get_executor().submit(generate, *args))
+
+
+def ready_variants(post, kind):
+    """Готовые размеры картинки по возрастанию ширины.
+
+    Недостающие размеры создаются при публикации или командой
+    warm_thumbnails, страница обходится уже готовыми. Уменьшенные до
+    ширины оригинала размеры совпадают и возвращаются один раз.
+    """
+    if not post.image:
+        return []
+    ready = {}
+    for geometry, options in variants(kind):
+        thumbnail = ready_backend.get_ready_thumbnail(
+            post.image, geometry, **options
+        )
+        if thumbnail is not None:
+            ready.setdefault(thumbnail.width, thumbnail)
+    return [ready[width] for width in sorted(ready)]
+
+
+def pick_src(thumbnails, width):
+    """Размер для src: наибольший не шире width, иначе наименьший."""
+    fitting = [image for image in thumbnails if image.width <= width]
+    return fitting[-1] if fitting else thumbnails[0]
@@ -0,0 +1,203 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.db.models import F
+from posts.models import Follow, Post, TimelineEntry, UserCounter
+from posts.paginators import CursorPaginator
+from posts.utils import bulk_insert, is_cursor_mode
+
+BATCH_SIZE = 1000
+
+REBUILD_SQL = '''
+    INSERT INTO posts_timelineentry (user_id, author_id, post_id, pub_date)
+    SELECT follow.user_id, post.author_id, post.id, post.pub_date
+    FROM posts_follow AS follow
+    JOIN posts_post AS post ON post.author_id = follow.author_id
+    WHERE follow.author_id NOT IN (
+        SELECT user_id FROM posts_usercounter WHERE timeline_partial
+    )
+'''
+BACKFILL_SQL = '''
+    {insert} posts_timelineentry (user_id, author_id, post_id, pub_date)
+    SELECT follow.user_id, post.author_id, post.id, post.pub_date
+    FROM posts_follow AS follow
+    JOIN posts_post AS post ON post.author_id = follow.author_id
+    WHERE follow.author_id = %s{suffix}
+'''
+
+
+def is_celebrity(author_id):
+    """Посты авторов с огромным числом подписчиков не раскладываются."""
+    return UserCounter.objects.filter(
+        user_id=author_id,
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def skip_fan_out(author_id):
+    """Запоминает, что посты автора разложены не всем подписчикам.
+
+    Решение о подмешивании при чтении принимается по этому флагу, а не
+    по текущему числу подписчиков: иначе посты автора, опустившегося
+    ниже TIMELINE_FANOUT_LIMIT, пропали бы из лент.
+    """
+    UserCounter.objects.filter(
+        user_id=author_id, timeline_partial=False
+    ).update(timeline_partial=True)
+
+
+def backfill(author_id):
+    """Раскладывает все посты автора, переставшего быть знаменитостью.
+
+    Флаг снимает тот же UPDATE, что проверяет условие, так что из
+    параллельных запросов раскладывает только один. До коммита читатели
+    видят флаг и подмешивают посты автора сами. Возвращает True, если
+    посты разложены.
+    """
+    sql = BACKFILL_SQL.format(
+        insert=connection.ops.insert_statement(ignore_conflicts=True),
+        suffix=connection.ops.ignore_conflicts_suffix_sql(
+            ignore_conflicts=True
+        ),
+    )
+    with transaction.atomic():
+        claimed = UserCounter.objects.filter(
+            user_id=author_id,
+            timeline_partial=True,
+            followers_count__lt=settings.TIMELINE_FANOUT_LIMIT,
+        ).update(timeline_partial=False)
+        if claimed:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, (author_id,))
+    return bool(claimed)
+
+
+def fan_out_post(post):
+    if is_celebrity(post.author_id):
+        skip_fan_out(post.author_id)
+        return
+    bulk_insert(
+        TimelineEntry,
+        (
+            TimelineEntry(
+                user_id=user_id,
+                author_id=post.author_id,
+                post_id=post.pk,
+                pub_date=post.pub_date,
+            )
+            for user_id in Follow.objects.filter(
+                author_id=post.author_id
+            ).values_list('user_id', flat=True).iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def add_author(user_id, author_id):
+    if is_celebrity(author_id):
+        skip_fan_out(author_id)
+        return
+    bulk_insert(
+        TimelineEntry,
+        (
+            TimelineEntry(
+                user_id=user_id,
+                author_id=author_id,
+                post_id=post_id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in Post.objects.filter(
+                author_id=author_id
+            ).values_list('pk', 'pub_date').iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def remove_author(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def remove_post(post_id):
+    TimelineEntry.objects.filter(post_id=post_id).delete()
+
+
+def rebuild():
+    """Собирает ленты заново одним INSERT ... SELECT.
+
+    Знаменитостями становятся авторы, у которых сейчас не меньше
+    TIMELINE_FANOUT_LIMIT подписчиков, остальные раскладываются.
+    """
+    TimelineEntry.objects.all().delete()
+    UserCounter.objects.update(timeline_partial=False)
+    UserCounter.objects.filter(
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT
+    ).update(timeline_partial=True)
+    with connection.cursor() as cursor:
+        cursor.execute(REBUILD_SQL)
+        return cursor.rowcount
+
+
+class TimelinePaginator(CursorPaginator):
+    """Курсорное разбиение ленты из нескольких источников.
+
+    Каждый источник отдаёт свою страницу по индексу, а страницы
+    сливаются в памяти - так посты знаменитостей подмешиваются к
+    разложенной ленте без общего запроса.
+    """
+    key_field = 'post_id'
+
+    def __init__(self, parts, per_page):
+        # Paginator проверяет порядок object_list, страницы же берутся
+        # из self.parts.
+        super().__init__(self._ordered(parts[0], backwards=False), per_page)
+        self.parts = parts
+
+    def _fetch(self, queryset, position, backwards):
+        rows = {}
+        for part in self.parts:
+            for row in super()._fetch(part, position, backwards):
+                rows[row['post_id']] = row
+        return sorted(
+            rows.values(),
+            key=self._position,
+            reverse=not backwards,
+        )[:self.per_page + 1]
+
+
+def timeline_parts(user):
+    parts = [
+        TimelineEntry.objects.filter(user=user).values('pub_date', 'post_id')
+    ]
+    celebrities = Follow.objects.filter(
+        user=user, author__counter__timeline_partial=True
+    ).values('author_id')
+    if celebrities.exists():
+        parts.append(
+            Post.objects.filter(author_id__in=celebrities)
+            .order_by()
+            .values('pub_date', post_id=F('pk'))
+        )
+    return parts
+
+
+def hydrate(page):
+    """Заменяет строки страницы постами, загруженными одним запросом."""
+    ids = [row['post_id'] for row in page.object_list]
+    posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+    page.object_list = [posts[pk] for pk in ids if pk in posts]
+    return page
+
+
+def get_timeline_page(request, user):
+    parts = timeline_parts(user)
+    if is_cursor_mode(request):
+        paginator = TimelinePaginator(parts, settings.POSTS_NUMBER)
+        return hydrate(paginator.get_page(request.GET.get('cursor')))
+    rows = parts[0].union(*parts[1:]) if len(parts) > 1 else parts[0]
+    paginator = Paginator(
+        rows.order_by('-pub_date', '-post_id'), settings.POSTS_NUMBER
+    )
+    return hydrate(paginator.get_page(request.GET.get('page')))
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+
+def oversized_uploads(request):
+    """Имена полей, файлы которых отброшены из-за размера."""
+    return getattr(request, 'oversized_uploads', frozenset())
+
+
+class ImageSizeLimitUploadHandler(FileUploadHandler):
+    """Прекращает приём файла, как только он превысил лимит.
+
+    Стоит первым в FILE_UPLOAD_HANDLERS и лишь считает байты, передавая
+    куски дальше, так что слишком большой файл не попадает ни в память,
+    ни во временный файл целиком. Отброшенные поля запоминаются
+    в request.oversized_uploads, чтобы форма могла сообщить об ошибке.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def _reject(self):
+        self.request.oversized_uploads = (
+            oversized_uploads(self.request) | {self.field_name}
+        )
+        raise SkipFile
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.IMAGE_MAX_UPLOAD_SIZE:
+            self._reject()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
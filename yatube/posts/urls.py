@@ -1,16 +1,40 @@
-from django.urls import path
+from django.urls import path, register_converter
 from posts import views
+from posts.syndication import FeedConverter
+
+register_converter(FeedConverter, 'feed')
 
 app_name = 'posts'
 urlpatterns = [
     path('', views.index, name='index'),
+    path('<feed:kind>/', views.index_feed, name='index_feed'),
     path(
         'group/<slug:slug>/',
         views.group_posts,
         name='group_list'
     ),
+    path(
+        'group/<slug:slug>/<feed:kind>/',
+        views.group_feed,
+        name='group_feed'
+    ),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path(
+        'profile/<str:username>/<feed:kind>/',
+        views.profile_feed,
+        name='profile_feed'
+    ),
+    path(
+        'profile/<str:username>/export/',
+        views.profile_export,
+        name='profile_export'
+    ),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path(
@@ -18,6 +42,7 @@ urlpatterns = [
         views.add_comment,
         name='add_comment'
     ),
+    path('search/', views.search, name='search'),
     path('follow/', views.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/',
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from posts.paginators import CursorPaginator
+
+
+def is_cursor_mode(request):
+    if 'cursor' in request.GET:
+        return True
+    return 'page' not in request.GET and settings.POSTS_PAGINATION == 'cursor'
+
+
+def get_page_obj(request, post_list, count=None):
+    """Возвращает страницу ленты.
+
+    Параметр ?cursor= включает курсорный режим, ?page= оставляет прежнее
+    числовое разбиение. Без параметров режим задаёт POSTS_PAGINATION.
+    Известное заранее число постов (count) избавляет от запроса COUNT.
+    """
+    if not is_cursor_mode(request):
+        paginator = Paginator(post_list, settings.POSTS_NUMBER)
+        if count is not None:
+            paginator.count = count
+        return paginator.get_page(request.GET.get('page'))
+    paginator = CursorPaginator(post_list, settings.POSTS_NUMBER)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bulk_insert(model, objects, batch_size=1000, ignore_conflicts=False):
+    """bulk_create по частям, не собирая все объекты в памяти.
+
+    bulk_create превращает генератор в список целиком, а явный batch_size
+    в Django 2.2 не учитывает ограничение SQLite на число параметров
+    запроса. Поэтому объекты копятся пачками по batch_size, а внутри
+    пачки размер INSERT выбирает сама база.
+    """
+    for batch in batches(objects, batch_size):
+        model.objects.bulk_create(batch, ignore_conflicts=ignore_conflicts)
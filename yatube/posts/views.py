@@ -1,17 +1,43 @@
+from datetime import datetime
+from urllib.parse import urlencode
+
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils import timezone
+from django.utils.http import http_date
+from core.throttling import throttle
+from posts import bulk
+from posts.cache import (GROUPS, POSTS, PROFILES, add_dependencies,
+                         last_modified, versioned_etag, versioned_page)
+from posts.counters import get_user_counter
+from posts.follows import follow, unfollow
 from posts.forms import CommentForm, PostForm
-from posts.models import Follow, Group, Post, User
+from posts.models import Comment, Follow, Group, Post, User
+from posts.paginators import CommentPaginator
+from posts.search import PostSearchResults, search_groups
+from posts.syndication import FEEDS, post_item, stream_feed
+from posts.thumbnails import schedule as schedule_thumbnail
+from posts.timeline import get_timeline_page
+from posts.uploads import oversized_uploads
+from posts.utils import get_page_obj
+
+EXPORT_CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
 
 
+@versioned_page('index')
 def index(request):
     template = 'posts/index.html'
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, settings.POSTS_NUMBER)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.select_related('author', 'group')
+    page_obj = get_page_obj(request, post_list)
     context = {
         'title': 'Это главная страница проекта Yatube',
         'page_obj': page_obj,
@@ -19,12 +45,11 @@ def index(request):
     return render(request, template, context)
 
 
+@versioned_page('group:{slug}', GROUPS)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, settings.POSTS_NUMBER)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = group.posts.select_related('author')
+    page_obj = get_page_obj(request, post_list, group.posts_count)
     template = 'posts/group_list.html'
     context = {
         'group': group,
@@ -33,13 +58,14 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@versioned_page('profile:{username}', PROFILES)
 def profile(request, username):
-    user_object = get_object_or_404(User, username=username)
-    post_list = user_object.posts.all()
-    post_count = post_list.count()
-    paginator = Paginator(post_list, settings.POSTS_NUMBER)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    user_object = get_object_or_404(
+        User.objects.select_related('counter'), username=username
+    )
+    counter = get_user_counter(user_object)
+    post_list = user_object.posts.select_related('group')
+    page_obj = get_page_obj(request, post_list, counter.posts_count)
     template = 'posts/profile.html'
     following = False
     if request.user.username:
@@ -49,39 +75,96 @@ def profile(request, username):
         ).exists()
     context = {
         'page_obj': page_obj,
-        'post_count': post_count,
+        'post_count': counter.posts_count,
+        'counter': counter,
         'author': user_object,
         'following': following,
     }
     return render(request, template, context)
 
 
+@versioned_page('post:{post_id}', POSTS)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    post_count = post.author.posts.count()
+    post = get_object_or_404(
+        Post.objects.select_related('author__counter', 'group'), pk=post_id
+    )
+    add_dependencies(request, f'profile:{post.author.username}')
+    post_count = get_user_counter(post.author).posts_count
     template = 'posts/post_detail.html'
     form = CommentForm()
     context = {
         'post_count': post_count,
         'post': post,
         'form': form,
-        'comments': post.comments.all()
+        'comments': get_comments_page(post.pk, request.GET.get('comments')),
     }
     return render(request, template, context)
 
 
+def get_comments_page(post_id, cursor):
+    paginator = CommentPaginator(
+        Comment.objects.filter(post_id=post_id).select_related(
+            'author'
+        ).order_by('created', 'pk'),
+        settings.COMMENTS_NUMBER,
+    )
+    return paginator.get_page(cursor)
+
+
+@versioned_page('post:{post_id}', POSTS)
+def post_comments(request, post_id):
+    """Следующая страница комментариев для кнопки «Показать ещё»."""
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    comments = get_comments_page(post_id, request.GET.get('cursor'))
+    next_url = None
+    if comments.has_next():
+        next_url = '{}?{}'.format(
+            reverse('posts:post_comments', args=(post_id,)),
+            urlencode({'cursor': comments.next_cursor}),
+        )
+    return JsonResponse({
+        'html': render_to_string(
+            'posts/includes/list_post_comment.html',
+            {'comments': comments},
+            request,
+        ),
+        'next_cursor': comments.next_cursor,
+        'next_url': next_url,
+    })
+
+
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    context = {'query': query}
+    if query:
+        paginator = Paginator(PostSearchResults(query), settings.POSTS_NUMBER)
+        context.update({
+            'page_obj': paginator.get_page(request.GET.get('page')),
+            'groups': search_groups(query),
+            'extra_query': urlencode({'q': query}) + '&',
+        })
+    return render(request, template, context)
+
+
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
     if request.method != 'POST':
         form = PostForm()
         return render(request, template, {'form': form})
-    form = PostForm(request.POST, files=request.FILES or None)
+    form = PostForm(
+        request.POST,
+        files=request.FILES or None,
+        oversized=oversized_uploads(request),
+    )
     username = request.user.username
     if form.is_valid():
-        form = form.save(commit=False)
-        form.author = request.user
-        form.save()
+        post = form.save(commit=False)
+        post.author = request.user
+        post.save()
+        schedule_thumbnail(post)
         return redirect('posts:profile', username=username)
     return render(request, template, {'form': form})
 
@@ -103,9 +186,12 @@ def post_edit(request, post_id):
         request.POST,
         files=request.FILES or None,
         instance=post,
+        oversized=oversized_uploads(request),
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            schedule_thumbnail(post)
         return redirect('posts:post_detail', post_id=post.id)
     return render(request, template, {
         'form': form,
@@ -115,25 +201,24 @@ def post_edit(request, post_id):
 
 
 @login_required
+@throttle('comment')
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
+    # Id поста уже известен из адреса: пост целиком не загружается,
+    # а пустые и невалидные формы вовсе не доходят до базы.
     if form.is_valid():
+        if not Post.objects.filter(pk=post_id).exists():
+            raise Http404
         comment = form.save(commit=False)
         comment.author = request.user
-        comment.post = post
+        comment.post_id = post_id
         comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.select_related('author').filter(
-        author__following__user=request.user
-    )
-    paginator = Paginator(post_list, settings.POSTS_NUMBER)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = get_timeline_page(request, request.user)
     template = 'posts/follow_index.html'
     context = {
         'title': 'Избранные авторы',
@@ -142,23 +227,114 @@ def follow_index(request):
     return render(request, template, context)
 
 
+def get_author_id(username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        raise Http404
+    return author_id
+
+
 @login_required
+@throttle('follow')
 def profile_follow(request, username):
     if request.user.username != username:
-        Follow.objects.get_or_create(
-            user=request.user,
-            author=get_object_or_404(User, username=username)
-        )
+        follow(request.user.pk, get_author_id(username))
     return redirect('posts:profile', username=username)
 
 
 @login_required
+@throttle('follow')
 def profile_unfollow(request, username):
+    unfollow(request.user.pk, get_author_id(username))
+    return redirect('posts:profile', username=username)
+
+
+def post_feed(request, kind, posts, title, link, description=''):
+    """Лента RSS или Atom из FEED_ITEMS последних постов, потоком.
+
+    Last-Modified - время последнего изменения версий ленты (их задаёт
+    versioned_etag), так что его сдвигает и удаление поста, а
+    If-Modified-Since с той же датой получает 304 без запросов к базе.
+    """
+    posts = posts.order_by('-pub_date', '-pk')[:settings.FEED_ITEMS]
+    modified = last_modified(request.cache_dependencies)
+    response = get_conditional_response(request, last_modified=modified)
+    if response is not None:
+        return response
+    feed = FEEDS[kind](
+        title=title,
+        link=request.build_absolute_uri(link),
+        description=description or title,
+        feed_url=request.build_absolute_uri(),
+        language='ru',
+    )
+    feed.updated = datetime.fromtimestamp(modified, timezone.utc)
+    items = (
+        post_item(post, request.build_absolute_uri(
+            reverse('posts:post_detail', args=(post.pk,))
+        ))
+        for post in posts.select_related('author', 'group').iterator(
+            chunk_size=settings.STREAM_CHUNK_SIZE
+        )
+    )
+    response = StreamingHttpResponse(
+        stream_feed(feed, items), content_type=feed.content_type
+    )
+    response['Last-Modified'] = http_date(modified)
+    return response
+
+
+@versioned_etag('index')
+def index_feed(request, kind):
+    return post_feed(
+        request, kind, Post.objects.all(), 'Последние обновления Yatube',
+        reverse('posts:index'),
+    )
+
+
+@versioned_etag('group:{slug}', GROUPS)
+def group_feed(request, slug, kind):
+    group = get_object_or_404(Group, slug=slug)
+    return post_feed(
+        request, kind, group.posts.all(), group.title,
+        reverse('posts:group_list', args=(slug,)), group.description,
+    )
+
+
+@versioned_etag('profile:{username}', PROFILES)
+def profile_feed(request, username, kind):
     author = get_object_or_404(User, username=username)
-    follower = Follow.objects.filter(
-        user=request.user,
-        author=author
+    return post_feed(
+        request, kind, author.posts.all(),
+        f'Записи {author.get_full_name() or author.username}',
+        reverse('posts:profile', args=(username,)),
     )
-    if follower.exists():
-        follower.delete()
-    return redirect('posts:profile', username=username)
+
+
+@login_required
+@versioned_etag('profile:{username}', PROFILES)
+@throttle('export')
+def profile_export(request, username):
+    """Все посты пользователя файлом JSON Lines или CSV, потоком.
+
+    Выгрузить можно только свои посты. Посты читаются пачками по
+    STREAM_CHUNK_SIZE, так что память не растёт с их числом.
+    """
+    if request.user.username != username:
+        return redirect('posts:profile', username=username)
+    data_format = request.GET.get('format')
+    if data_format not in bulk.FORMATS:
+        data_format = 'jsonl'
+    rows = bulk.export_author_posts(
+        request.user.pk, settings.STREAM_CHUNK_SIZE
+    )
+    response = StreamingHttpResponse(
+        bulk.format_rows(data_format, bulk.AUTHOR_POST_FIELDS, rows),
+        content_type=EXPORT_CONTENT_TYPES[data_format],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{username}-posts.{data_format}"'
+    )
+    return response